@@ -18,16 +18,57 @@ const Dash = () => {
   useEffect(() => {
     if (!partnerPhone) return;
 
-    socketRef.current = new WebSocket("ws://localhost:8001/ws/orders/partner/");
+    const stream = `partner_${partnerPhone}`;
+    let lastSeq = null; // last event seen on our own stream, sent back on reconnect
+    let epoch = null; // numbering run lastSeq belongs to
+    let closed = false;
+    let retry = null;
 
-    socketRef.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      setNewOrders((prev) => (!prev.find((o) => o.order_id === data.order_id) ? [...prev, data] : prev));
-      setPendingOrders((prev) => prev.map((o) => (o.order_id === data.order_id ? { ...o, ...data } : o)));
+    const connect = () => {
+      const resume = lastSeq !== null ? `&epoch=${epoch ?? ""}&last_seq=${lastSeq}` : "";
+      socketRef.current = new WebSocket(`ws://localhost:8001/ws/orders/partner/?phone=${partnerPhone}${resume}`);
+
+      socketRef.current.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.stream === stream && message.seq !== undefined) {
+          // A new epoch restarts numbering, so its seq replaces ours even if smaller
+          lastSeq = message.epoch === epoch ? Math.max(lastSeq ?? 0, message.seq) : message.seq;
+          epoch = message.epoch;
+        }
+        // Open-orders snapshot sent on connect
+        if (Array.isArray(message.orders)) {
+          setNewOrders(message.orders);
+          return;
+        }
+        // Missed too much while disconnected: re-fetch everything
+        if (message.resync) {
+          lastSeq = null;
+          epoch = null;
+          fetchOrders();
+          return;
+        }
+        const data = message.order || message;
+        if (data.delivery_status && data.delivery_status !== "placed") {
+          // Update about an order assigned to this partner
+          setNewOrders((prev) => prev.filter((o) => o.order_id !== data.order_id));
+        } else {
+          setNewOrders((prev) => (!prev.find((o) => o.order_id === data.order_id) ? [...prev, data] : prev));
+        }
+        setPendingOrders((prev) => prev.map((o) => (o.order_id === data.order_id ? { ...o, ...data } : o)));
+      };
+
+      socketRef.current.onclose = () => {
+        console.log("WebSocket disconnected");
+        if (!closed) retry = setTimeout(connect, 2000);
+      };
     };
 
-    socketRef.current.onclose = () => console.log("WebSocket disconnected");
-    return () => socketRef.current?.close();
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      socketRef.current?.close();
+    };
   }, [partnerPhone]);
 
   // Fetch orders from backend
@@ -50,10 +91,69 @@ const Dash = () => {
     }
   };
 
+  const fetchHistory = async () => {
+    const res = await axios.get(`${API_BASE}/orders/history/?phone=${partnerPhone}`);
+    setCompletedOrders(Array.isArray(res.data) ? res.data : []);
+  };
+
+  // Merge orders returned by the changes feed into the three lists
+  const applyChanges = (changes) => {
+    let historyChanged = false;
+    changes.forEach((order) => {
+      const mine = order.assigned_to?.phone_number === partnerPhone;
+      const isNew = !order.assigned_to && order.delivery_status === "placed";
+      const isPending = mine && order.delivery_status === "assigned";
+      if (mine && ["delivered", "cancelled"].includes(order.delivery_status)) historyChanged = true;
+
+      setNewOrders((prev) => [...prev.filter((o) => o.order_id !== order.order_id), ...(isNew ? [order] : [])]);
+      setPendingOrders((prev) => [...prev.filter((o) => o.order_id !== order.order_id), ...(isPending ? [order] : [])]);
+    });
+    if (historyChanged) fetchHistory().catch((err) => console.error("Error fetching history:", err));
+  };
+
+  // Only fetch what changed since the last poll
+  const pollChanges = async (since) => {
+    let token = since;
+    let hasMore = true;
+    while (hasMore) {
+      const res = await axios.get(`${API_BASE}/orders/changes/?since=${token}`);
+      applyChanges(res.data.changes || []);
+      token = res.data.next;
+      hasMore = res.data.has_more;
+    }
+    return token;
+  };
+
   useEffect(() => {
-    fetchOrders();
-    const interval = setInterval(fetchOrders, 5000); // poll every 5s
-    return () => clearInterval(interval);
+    if (!partnerPhone) return;
+    let since = null;
+    let cancelled = false;
+
+    const start = async () => {
+      try {
+        // Take the token before the full load so nothing slips through the gap
+        const res = await axios.get(`${API_BASE}/orders/changes/`);
+        since = res.data.next;
+      } catch (err) {
+        console.error("Error fetching change token:", err.response?.data || err);
+      }
+      await fetchOrders();
+    };
+
+    start();
+    const interval = setInterval(async () => {
+      if (cancelled) return;
+      if (since === null) return start();
+      try {
+        since = await pollChanges(since);
+      } catch (err) {
+        console.error("Error polling order changes:", err.response?.data || err);
+      }
+    }, 5000); // poll every 5s
+    return () => {
+      cancelled = true;
+      clearInterval(interval);
+    };
   }, [partnerPhone]);
 
   const handleConfirm = async (orderId) => {
@@ -68,6 +168,8 @@ const Dash = () => {
       setPendingOrders((prev) => [...prev, updatedOrder]);
     } catch (err) {
       console.error("Error confirming order:", err.response?.data || err);
+      // Another partner took it first
+      if (err.response?.status === 409) setNewOrders((prev) => prev.filter((o) => o.order_id !== orderId));
       alert(err.response?.data?.error || "Failed to confirm order");
     }
   };
@@ -79,8 +181,7 @@ const Dash = () => {
         { status: "delivered" },
         { headers: { "Content-Type": "application/json" } }
       );
-      const res = await axios.get(`${API_BASE}/orders/history/?phone=${partnerPhone}`);
-      setCompletedOrders(Array.isArray(res.data) ? res.data : []);
+      await fetchHistory();
       setPendingOrders((prev) => prev.filter((o) => o.order_id !== orderId));
     } catch (err) {
       console.error("Error completing order:", err.response?.data || err);
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,20 +78,59 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 ASGI_APPLICATION = "backend.asgi.application"
 
-# Use Redis for channel layer
-# CHANNEL_LAYERS = {
-#     "default": {
-#         "BACKEND": "channels_redis.core.RedisChannelLayer",
-#         "CONFIG": {
-#             "hosts": [("127.0.0.1", 6379)],
-#         },
-#     },
-# }
-
-CHANNEL_LAYERS = {
-    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+# Channel layer. Set CHANNEL_REDIS_HOSTS (comma separated, e.g.
+# "redis://10.0.0.5:6379,redis://10.0.0.6:6379") to share broadcasts across
+# several ASGI workers; groups are spread over the hosts with a consistent
+# hash ring (core/layers.py). Without it the in-memory layer stands in,
+# which only reaches consumers in the same process.
+CHANNEL_REDIS_HOSTS = [host.strip() for host in os.environ.get('CHANNEL_REDIS_HOSTS', '').split(',') if host.strip()]
+
+if CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "core.layers.ShardedRedisChannelLayer",
+            "CONFIG": {
+                "hosts": CHANNEL_REDIS_HOSTS,
+                "capacity": 1500,
+                "expiry": 10,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+
+# Per-connection WebSocket send queue (core/outbox.py). A client that falls
+# more than 'maxsize' frames behind loses frames by 'policy':
+# 'drop_oldest', 'coalesce' (keep only the latest frame per order) or
+# 'disconnect' (close with 1013 so the client reconnects and re-syncs).
+# 'coalesce_window' (seconds) holds each burst that long and sends only
+# the latest frame per order; 0 sends immediately.
+WS_SEND_QUEUE = {
+    'maxsize': 100,
+    'policy': 'coalesce',
+    'coalesce_window': 0.05,
+}
+
+# Replay buffer for resumable WebSocket streams (core/replay.py): the last
+# 'size' order events of every group, kept in the 'cache' alias. Point it
+# at a shared cache when running several workers. Positions carry an epoch
+# that changes whenever the cache loses a group's counter; clients resuming
+# from another epoch are told to resync.
+WS_REPLAY = {
+    'enabled': True,
+    'size': 200,
+    'ttl': 3600,
+    'cache': 'ws_replay',
 }
 
+# Send order broadcasts from a background loop after commit instead of
+# blocking the request thread (core/utils.py). Only for the Redis layer:
+# the in-memory layer's queues belong to the ASGI server's event loop, so
+# its sends always go inline on commit (ignored for it even when True).
+BROADCAST_ASYNC = bool(CHANNEL_REDIS_HOSTS)
+
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173", 
@@ -99,6 +139,9 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5176", 
 ]
 
+# Let the browser clients read the pagination cursor and ETags
+CORS_EXPOSE_HEADERS = ["X-Next-Cursor", "Link", "ETag"]
+
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173"
     "http://localhost:5174"
@@ -112,12 +155,138 @@ CSRF_TRUSTED_ORIGINS = [
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # django.db.backends.sqlite3 plus OPTIONS['transaction_mode'] (core/backends/sqlite3)
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Keep connections open between requests instead of reconnecting
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent order writes wait
+            # on busy_timeout instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # File-backed test database so the threaded tests exercise real locking
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Optional read replica for the heavy history/listing reads (core/db.py).
+# Locally, point REPLICA_DATABASE_PATH at a second SQLite file and keep it
+# in sync with `python manage.py sync_replica`.
+# Read-your-writes stickiness lives in REPLICA_STICKY_CACHE, which every
+# worker must share: while it is a LocMemCache, reads stay on the primary.
+REPLICA_DATABASE = 'replica'
+REPLICA_STICKY_SECONDS = 10  # read-your-writes window per phone number
+REPLICA_STICKY_CACHE = 'default'
+if os.environ.get('REPLICA_DATABASE_PATH'):
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': os.environ['REPLICA_DATABASE_PATH'],
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+# The committed db.sqlite3 is sample data. Connections to it get no
+# pragmas (journal_mode=WAL is stored in the file itself), so running the
+# app never rewrites it; point SQLITE_DATABASE_PATH at a copy to use WAL
+# and the tuning below.
+SQLITE_FIXTURE_DATABASE = BASE_DIR / 'db.sqlite3'
+
+# Applied to every other new SQLite connection (core/db.py), test databases included
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # readers don't block on writers
+    'synchronous': 'NORMAL',     # safe with WAL, far fewer fsyncs
+    'busy_timeout': 5000,        # ms to wait for the write lock (at BEGIN IMMEDIATE)
+    'mmap_size': 268435456,      # 256 MB
+    'cache_size': -64000,        # 64 MB page cache
+    'temp_store': 'MEMORY',
 }
 
 
+# OTP SMS delivery (core/sms.py). The 2factor.in key only comes from the
+# environment; without it OTPs are printed by 'core.sms.ConsoleBackend'
+# instead of sent ('core.sms.LocMemBackend' keeps them in memory).
+TWOFACTOR_API_KEY = os.environ.get('TWOFACTOR_API_KEY')
+SMS_BACKEND = 'core.sms.TwoFactorBackend' if TWOFACTOR_API_KEY else 'core.sms.ConsoleBackend'
+SMS_ASYNC = True
+SMS_WORKERS = 4
+SMS_TIMEOUT = (3, 5)  # connect, read (seconds)
+SMS_MAX_RETRIES = 3
+SMS_BACKOFF = 0.5
+
+
+# Caches. Point these at Redis/Memcached when running more than one
+# worker process, otherwise rate limits (and CacheOTPStore OTPs) are per-process.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # WebSocket replay buffers (WS_REPLAY); kept apart so they never cull OTPs
+    "ws_replay": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "ws-replay",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+# OTP storage (core/otp_store.py). The send and the verify request can land
+# on different workers, so OTPs live in the OTP table by default. Switch to
+# 'core.otp_store.CacheOTPStore' only once OTP_CACHE points at a shared
+# cache (Redis/Memcached); with the per-process LocMemCache above a worker
+# can't see OTPs saved by another.
+OTP_STORE = 'core.otp_store.DatabaseOTPStore'
+OTP_CACHE = 'default'
+OTP_TTL = 300  # seconds
+OTP_EXPIRED_GRACE = 60  # keep expired cache entries this long to report 'expired'
+OTP_PURGE_INTERVAL = 600  # DB store: purge expired rows at most this often
+
+
+# Cached /api/orders/unassigned/ pages (core/feed_cache.py). Set
+# 'shared_cache' to a cache alias to share them (and invalidations)
+# across worker processes.
+FEED_CACHE = {
+    'enabled': True,
+    'maxsize': 128,
+    'ttl': 60,  # seconds; safety net for writes that skip invalidation
+    'shared_cache': None,
+}
+
+# Archiving of finished orders (core/archive.py, `manage.py archive_orders`)
+ORDER_ARCHIVE_AFTER_DAYS = 90
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# Token-bucket rate limits for the OTP/login endpoints (core/ratelimit.py).
+# (requests, per seconds) per client IP and per phone number.
+# 'core.ratelimit.CacheBackend' shares the buckets across workers.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_BACKEND = 'core.ratelimit.LocalBackend'
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+RATE_LIMITS = {
+    'send_otp': {'ip': (10, 60), 'phone': (3, 60)},
+    'verify_otp': {'ip': (20, 60), 'phone': (5, 60)},
+}
+
+
+# JSON encoding for API responses and WebSocket frames (core/fastjson.py).
+# 'orjson' uses orjson when installed; 'json' forces the stdlib encoder.
+JSON_BACKEND = 'orjson'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Order listing pagination (see core/pagination.py). Only applies once a
+# client sends ?page_size= or ?cursor=; without either the full list is returned.
+ORDER_PAGE_SIZE = 50
+ORDER_PAGE_SIZE_MAX = 200
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
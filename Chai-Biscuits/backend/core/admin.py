@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser, Order, OTP, OrderItem, DeliveryPartner, DeliveryHistory
+from .models import CustomUser, Order, OTP, OrderItem, DeliveryPartner, DeliveryHistory, ArchivedOrder, ArchivedDeliveryHistory
 
 # CustomUser Admin (no password fields)
 @admin.register(CustomUser)
@@ -44,4 +44,13 @@ class DeliveryPartnerAdmin(admin.ModelAdmin):
     list_filter = ('is_online',)
 
 
-admin.site.register(DeliveryHistory)
\ No newline at end of file
+admin.site.register(DeliveryHistory)
+
+# Archived orders (read-only history, see core/archive.py)
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('order_id', 'user', 'total_amount', 'delivery_status', 'placed_at', 'archived_at')
+    search_fields = ('user__name', 'order_id')
+
+
+admin.site.register(ArchivedDeliveryHistory)
@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Order, OrderItem, DeliveryHistory, OpenOrder,
+    ArchivedOrder, ArchivedOrderItem, ArchivedDeliveryHistory,
+)
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+
+def archive_batch(cutoff, batch_size):
+    """
+    Move one batch of finished orders placed before `cutoff`, with their
+    items and delivery history, into the archive tables. Each batch is its
+    own transaction so the hot tables are never locked for long.
+    Returns the number of orders moved.
+    """
+    with transaction.atomic():
+        ids = list(
+            Order.objects.filter(delivery_status__in=ARCHIVABLE_STATUSES, placed_at__lt=cutoff)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=o.id, user_id=o.user_id, order_id=o.order_id, placed_at=o.placed_at,
+                out_for_delivery_at=o.out_for_delivery_at, delivery_time=o.delivery_time,
+                total_amount=o.total_amount, delivery_status=o.delivery_status,
+                delivery_address=o.delivery_address, assigned_to_id=o.assigned_to_id,
+                change_seq=o.change_seq,
+            )
+            for o in Order.objects.filter(pk__in=ids)
+        ])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                id=it.id, order_id=it.order_id, item_name=it.item_name,
+                quantity=it.quantity, price_per_item=it.price_per_item,
+            )
+            for it in OrderItem.objects.filter(order_id__in=ids)
+        ])
+        ArchivedDeliveryHistory.objects.bulk_create([
+            ArchivedDeliveryHistory(
+                id=h.id, delivery_partner_id=h.delivery_partner_id, order_id=h.order_id,
+                completed_at=h.completed_at, status=h.status, earnings=h.earnings,
+            )
+            for h in DeliveryHistory.objects.filter(order_id__in=ids)
+        ])
+
+        OpenOrder.objects.filter(order_id__in=ids).delete()
+        DeliveryHistory.objects.filter(order_id__in=ids).delete()
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(pk__in=ids).delete()
+        return len(ids)
+
+
+def archive_orders(days=None, batch_size=None):
+    days = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 90) if days is None else days
+    batch_size = batch_size or getattr(settings, 'ORDER_ARCHIVE_BATCH_SIZE', 500)
+    cutoff = timezone.now() - timedelta(days=days)
+
+    total = 0
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
@@ -0,0 +1,36 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The stock SQLite backend plus OPTIONS['transaction_mode'] (Django 5.1
+    has the same option built in). Django 4.2 opens every atomic block
+    with a deferred BEGIN, which only asks for the write lock at the first
+    write; a transaction that has already read and then finds another
+    writer ahead of it fails at once with "database is locked", and
+    busy_timeout does not apply. With 'IMMEDIATE' the write lock is taken
+    at BEGIN, where busy_timeout does apply, so concurrent writes queue
+    instead of failing.
+    """
+
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        mode = params.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] "
+                f"must be one of {', '.join(TRANSACTION_MODES)}"
+            )
+        self.transaction_mode = mode.upper() if mode else None
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            self.cursor().execute('BEGIN')
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
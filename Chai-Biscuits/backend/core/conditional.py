@@ -0,0 +1,68 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Strong ETag from the version markers of whatever a response is built
+    from (change_seq, updated_at, row counts, query params...).
+    """
+    raw = ':'.join(str(p) for p in parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def profiles_version():
+    """
+    Latest customer and partner profile edit, each one index seek. For
+    listings that span every order, where joining the embedded profiles
+    into queryset_etag would turn its index-only count into a table scan.
+    """
+    from .models import CustomUser, DeliveryPartner
+
+    return (
+        CustomUser.objects.aggregate(version=Max('updated_at'))['version'],
+        DeliveryPartner.objects.aggregate(version=Max('updated_at'))['version'],
+    )
+
+
+def queryset_etag(request, queryset, order_path='', profiles=True):
+    """
+    ETag for a listing of orders, from one aggregate query instead of
+    serializing it. Any write bumps the max change_seq, any removal drops
+    the count, a profile edit bumps the customer's or partner's updated_at
+    (both are embedded in every order), and the query string keeps
+    different pages/filters apart. `order_path` leads from the queryset's
+    model to the order, e.g. 'order__' for OpenOrder or DeliveryHistory.
+    Pass profiles=False when the caller versions the profiles itself
+    (see profiles_version).
+    """
+    aggregates = {'version': Max(f'{order_path}change_seq'), 'count': Count('pk')}
+    if profiles:
+        aggregates['user'] = Max(f'{order_path}user__updated_at')
+        aggregates['partner'] = Max(f'{order_path}assigned_to__updated_at')
+    stats = queryset.order_by().aggregate(**aggregates)
+    return make_etag(request.path, request.GET.urlencode(), *stats.values())
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    etags = [e[2:] if e.startswith('W/') else e for e in parse_etags(header)]
+    return '*' in etags or etag in etags
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    # Let clients keep the body but always revalidate it
+    response['Cache-Control'] = 'no-cache'
+    return response
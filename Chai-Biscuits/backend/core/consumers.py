@@ -1,58 +1,186 @@
-import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from core.models import Order, DeliveryPartner
+from core.models import Order, DeliveryPartner, OpenOrder
+from core.encoders import encode_orders_by_pk
+from core.fastjson import dumps_str
+from core.utils import UNASSIGNED_GROUP, partner_group
+from core.outbox import SendQueue
+from core.replay import replay_log
 
 User = get_user_model()
 
 
+@database_sync_to_async
+def open_orders_snapshot():
+    # Oldest open orders straight from the dispatch queue
+    limit = getattr(settings, 'ORDER_PAGE_SIZE', 50)
+    pks = list(OpenOrder.objects.order_by('placed_at', 'pk').values_list('pk', flat=True)[:limit])
+    encoded = encode_orders_by_pk(pks)
+    return [encoded[pk] for pk in pks if pk in encoded]
+
+
+@database_sync_to_async
+def partner_is_online(phone):
+    # None if there is no such partner
+    return DeliveryPartner.objects.filter(phone_number=phone).values_list('is_online', flat=True).first()
+
+
+def query_params(scope):
+    return {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+
+def status_filter(params):
+    """?status=placed,assigned -> {'placed', 'assigned'}; None means every status."""
+    statuses = {status.strip().lower() for status in params.get('status', '').split(',') if status.strip()}
+    return statuses or None
+
+
+class FilteredConsumer(AsyncWebsocketConsumer):
+    """
+    Tracks joined groups, drops order events outside the ?status= filter
+    and sends through a bounded per-connection queue (core/outbox.py).
+    """
+    queue = None
+    replayed = None
+
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        self.queue = SendQueue(self.send)
+        self.queue.start()
+
+    async def push(self, text, order_id=None):
+        if self.queue is None or self.queue.closed:
+            return
+        if not self.queue.put(text, order_id):
+            # Slow consumer under the 'disconnect' policy; the client reconnects and re-syncs
+            self.queue.close()
+            await self.close(code=1013)
+
+    async def join(self, group_name):
+        if group_name not in self.joined:
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            self.joined.add(group_name)
+
+    async def leave(self, group_name):
+        if group_name in self.joined:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+            self.joined.discard(group_name)
+
+    async def disconnect(self, close_code):
+        if self.queue is not None:
+            self.queue.close()
+        for group_name in list(getattr(self, 'joined', ())):
+            await self.leave(group_name)
+
+    def wants(self, event):
+        return self.statuses is None or event.get("delivery_status") in self.statuses
+
+    async def resume(self, group_name, params):
+        """
+        Replay the group's events after ?epoch=&last_seq= (core/replay.py),
+        or send {"resync": true} when some of them are no longer buffered,
+        or were numbered in another epoch, and the client has to re-fetch.
+        """
+        if 'last_seq' not in params:
+            return
+        try:
+            last_seq = int(params['last_seq'])
+        except ValueError:
+            last_seq = -1
+        epoch = params.get('epoch') or None
+        missed = await sync_to_async(replay_log.since)(group_name, epoch, last_seq)
+        if missed is None:
+            await self.push(dumps_str({"resync": True, "stream": group_name}))
+            return
+        epoch, current, events = missed
+        # Live events up to `current` were joined before the read and would repeat
+        self.replayed = {group_name: (epoch, current)}
+        for seq, order_id, delivery_status, frame in events:
+            if self.wants({"delivery_status": delivery_status}):
+                await self.push(frame, order_id)
+
+    async def order_updated(self, event):
+        # Frame was encoded once at publish time (utils.broadcast_to_groups)
+        if self.replayed and event.get("seq") is not None:
+            epoch, seq = self.replayed.get(event.get("stream"), (None, 0))
+            # A seq from another epoch is a new event however small it is
+            if event.get("epoch") == epoch and event["seq"] <= seq:
+                return
+        if self.wants(event):
+            await self.push(event["text"], event.get("order_id"))
+
+
 # For delivery partners
-class PartnerOrderConsumer(AsyncWebsocketConsumer):
+class PartnerOrderConsumer(FilteredConsumer):
+    """
+    ws/orders/partner/?phone=<partner phone>&status=<status,...>&epoch=<epoch>&last_seq=<seq>
+
+    With a phone, the partner gets events for orders assigned to them
+    (partner_<phone>) and, only while DeliveryPartner.is_online, the open
+    orders feed. Without one it behaves as before: open orders only.
+    last_seq resumes partner_<phone>; the open orders feed is re-sent as a
+    snapshot on every connect anyway.
+    """
+
     async def connect(self):
-        self.group_name = "orders_unassigned"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        params = query_params(self.scope)
+        self.joined = set()
+        self.statuses = status_filter(params)
+        self.phone = params.get('phone')
+
+        online = True
+        if self.phone:
+            online = await partner_is_online(self.phone)
+            if online is None:
+                await self.close()
+                return
+            await self.join(partner_group(self.phone))
+        if online:
+            await self.join(UNASSIGNED_GROUP)
+
         await self.accept()
+        if self.phone:
+            await self.resume(partner_group(self.phone), params)
+        await self.send_open_orders()
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+    async def send_open_orders(self):
+        subscribed = UNASSIGNED_GROUP in self.joined and self.wants({"delivery_status": "placed"})
+        orders = await open_orders_snapshot() if subscribed else []
+        snapshot = {"orders": orders}
+        if self.phone:
+            # Where partner_<phone> stands, so a client can resume even before its first event
+            stream = partner_group(self.phone)
+            epoch, seq = await sync_to_async(replay_log.current)(stream)
+            snapshot.update(stream=stream, epoch=epoch, seq=seq)
+        await self.push(dumps_str(snapshot))
 
-    async def order_updated(self, event):
-        order = event['order']
-        print(f"[WS DEBUG] Sending order update: {order}")
-        assigned_to = order.get("assigned_to")
-        if assigned_to:
-            order["assigned_to"] = {
-                "name": assigned_to.get("name", "Unknown"),
-                "phone_number": assigned_to.get("phone_number", "")
-            }
-        await self.send(text_data=json.dumps({"order": order}))
     async def order_created(self, event):
-        await self.order_updated(event) 
+        await self.order_updated(event)
+
+    async def partner_status(self, event):
+        # Online/offline toggle (utils.notify_partner_status)
+        if event["is_online"]:
+            await self.join(UNASSIGNED_GROUP)
+        else:
+            await self.leave(UNASSIGNED_GROUP)
+        await self.send_open_orders()
 
 
 # For users
-class OrderConsumer(AsyncWebsocketConsumer):
+class OrderConsumer(FilteredConsumer):
     async def connect(self):
         # Extract phone from URL kwargs
         self.phone = self.scope['url_route']['kwargs'].get('phone')
-        if self.phone:
-            self.group_name = f"user_{self.phone}"
-        else:
-            self.group_name = "orders"
+        params = query_params(self.scope)
+        self.joined = set()
+        self.statuses = status_filter(params)
+        group_name = f"user_{self.phone}" if self.phone else "orders"
+        await self.join(group_name)
 
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
-
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.group_name, self.channel_name)
-
-    async def order_updated(self, event):
-        order = event["order"]
-        print(f"[WS DEBUG] Sending order update: {order}")
-        assigned_to = order.get("assigned_to")
-        if assigned_to:
-            order["assigned_to"] = {
-                "name": assigned_to.get("name", "Unknown"),
-                "phone_number": assigned_to.get("phone_number", "")
-            }
-        await self.send(text_data=json.dumps({"order": order}))
+        await self.resume(group_name, params)
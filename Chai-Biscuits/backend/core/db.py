@@ -0,0 +1,118 @@
+import logging
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Tune every new SQLite connection from settings.SQLITE_PRAGMAS. WAL lets
+    readers carry on while create_order/update_order_status write.
+    busy_timeout only covers waiting for the lock at BEGIN: a deferred
+    transaction that has already read fails at once when it needs to write,
+    which is why the default database opens transactions IMMEDIATE
+    (core/backends/sqlite3). `manage.py sqlite_concurrency` measures both.
+
+    The committed SQLITE_FIXTURE_DATABASE is left alone: WAL would be
+    written into the file and leave -wal/-shm files next to it.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    fixture = getattr(settings, 'SQLITE_FIXTURE_DATABASE', None)
+    if fixture and str(connection.settings_dict['NAME']) == str(fixture):
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# ----------------------------
+# Read replica routing
+# ----------------------------
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_warned = False
+
+
+def sticky_cache():
+    return caches[getattr(settings, 'REPLICA_STICKY_CACHE', 'default')]
+
+
+def replica_alias():
+    """
+    The replica's alias, or None when reads stay on the primary: no
+    replica configured, or no shared cache to keep read-your-writes
+    stickiness in. A write on one worker must pin the reads that land on
+    every other worker, so a per-process LocMemCache (or DummyCache)
+    turns replica routing off.
+    """
+    global _warned
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    if alias not in settings.DATABASES:
+        return None
+    if isinstance(sticky_cache(), (LocMemCache, DummyCache)):
+        if not _warned:
+            _warned = True
+            logger.warning(
+                "REPLICA_STICKY_CACHE is not shared between workers; reading from the "
+                "primary only. Point it at Redis/Memcached to use %s.", alias,
+            )
+        return None
+    return alias
+
+
+def _sticky_key(phone):
+    return f'replica_sticky:{phone}'
+
+
+def mark_recent_write(*phones):
+    """
+    Pin reads for these phone numbers to the primary for
+    REPLICA_STICKY_SECONDS, so users see their own writes before the
+    replica catches up.
+    """
+    if not replica_alias():
+        return
+    timeout = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+    sticky_cache().set_many({_sticky_key(phone): True for phone in phones if phone}, timeout=timeout)
+
+
+def read_from_replica(view):
+    """
+    Route the view's reads to the replica, unless the ?phone= caller wrote
+    something recently. Writes always go to the primary.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        phone = request.GET.get('phone')
+        if not replica_alias() or (phone and sticky_cache().get(_sticky_key(phone))):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
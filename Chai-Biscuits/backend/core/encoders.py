@@ -0,0 +1,130 @@
+"""
+Order -> dict encoding shared by every order endpoint and WebSocket
+broadcast. Works on values() rows instead of model instances and
+per-field serializer objects.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone
+from django.utils.duration import duration_string
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+ORDER_VALUES = (
+    'pk', 'order_id', 'placed_at', 'out_for_delivery_at', 'delivery_time',
+    'total_amount', 'delivery_status', 'change_seq',
+    'user__name', 'user__phone_number', 'user__address',
+    'assigned_to_id', 'assigned_to__name', 'assigned_to__phone_number',
+    # Not encoded; versions the embedded profiles for ETags
+    'user__updated_at', 'assigned_to__updated_at',
+)
+ITEM_VALUES = ('order_id', 'item_name', 'quantity', 'price_per_item')
+ITEM_MODELS = (OrderItem, ArchivedOrderItem)
+
+CENT = Decimal('0.01')
+
+
+def encode_money(value):
+    return None if value is None else str(value.quantize(CENT))
+
+
+def encode_datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def order_rows(queryset):
+    """Restrict an Order/ArchivedOrder queryset to the columns the encoder reads."""
+    return queryset.values(*ORDER_VALUES)
+
+
+def items_by_order(order_pks):
+    """Encoded items for the given order pks, hot and archived, in one query per table."""
+    grouped = defaultdict(list)
+    if not order_pks:
+        return grouped
+    for model in ITEM_MODELS:
+        rows = model.objects.filter(order_id__in=order_pks).order_by('order_id', 'pk').values_list(*ITEM_VALUES)
+        for order_pk, name, quantity, price in rows:
+            grouped[order_pk].append(_item(name, quantity, price))
+    return grouped
+
+
+def _item(name, quantity, price):
+    total = quantity * price if quantity is not None and price is not None else Decimal(0)
+    return {
+        'item_name': name,
+        'quantity': quantity,
+        'price_per_item': encode_money(price),
+        'total_price': encode_money(total),
+    }
+
+
+def encode_item(item):
+    """Encode an OrderItem instance already in memory."""
+    return _item(item.item_name, item.quantity, item.price_per_item)
+
+
+def encode_order(row, items):
+    user = {
+        'name': row['user__name'],
+        'phone_number': row['user__phone_number'],
+        'address': row['user__address'],
+    }
+    return {
+        'order_id': str(row['order_id']),
+        'placed_at': encode_datetime(row['placed_at']),
+        'out_for_delivery_at': encode_datetime(row['out_for_delivery_at']),
+        'delivery_time': duration_string(row['delivery_time']) if row['delivery_time'] is not None else None,
+        'total_amount': encode_money(row['total_amount']),
+        'delivery_status': row['delivery_status'],
+        'assigned_to': {
+            'id': row['assigned_to_id'],
+            'name': row['assigned_to__name'],
+            'phone_number': row['assigned_to__phone_number'],
+        } if row['assigned_to_id'] is not None else None,
+        'items': items,
+        'delivery_address': user['address'],
+        'user': user,
+        'version': row['change_seq'],
+    }
+
+
+def instance_row(order):
+    """
+    The order_rows() dict for an Order already in memory, read off the
+    instance along ORDER_VALUES (a missing assigned_to reads as None).
+    """
+    row = {}
+    for path in ORDER_VALUES:
+        value = order
+        for attr in path.split('__'):
+            value = None if value is None else getattr(value, attr)
+        row[path] = value
+    return row
+
+
+def encode_instance(order, items):
+    """Encode an Order and its OrderItems straight after writing them, without reading them back."""
+    return encode_order(instance_row(order), [encode_item(item) for item in items])
+
+
+def encode_rows(rows):
+    """Encode order_rows() dicts, fetching all of their items at once."""
+    items = items_by_order([row['pk'] for row in rows])
+    return [encode_order(row, items.get(row['pk'], [])) for row in rows]
+
+
+def encode_orders_by_pk(pks):
+    """{pk: encoded order} for hot and archived orders with these pks."""
+    rows = list(order_rows(Order.objects.filter(pk__in=pks)))
+    rows += list(order_rows(ArchivedOrder.objects.filter(pk__in=pks)))
+    return {row['pk']: order for row, order in zip(rows, encode_rows(rows))}
+
+
+def encode_order_by_pk(pk):
+    """Encode a single order (e.g. for a broadcast right after a write)."""
+    return encode_orders_by_pk([pk])[pk]
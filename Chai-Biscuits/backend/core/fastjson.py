@@ -0,0 +1,71 @@
+"""
+JSON encoding for HTTP responses and WebSocket frames. Uses orjson when it
+is installed (and JSON_BACKEND allows it), else the stdlib encoder. Both
+produce the same output for the types our payloads carry: Decimal as a
+string, timedelta as a DRF-style duration string, UUID as a string and
+UTC datetimes with a 'Z' suffix.
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.duration import duration_string
+from rest_framework.renderers import BaseRenderer
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, datetime.timedelta):
+        return duration_string(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, datetime.datetime):
+        value = obj.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def use_orjson():
+    return orjson is not None and getattr(settings, 'JSON_BACKEND', 'orjson') == 'orjson'
+
+
+def dumps(obj):
+    """Encode `obj` to UTF-8 JSON bytes."""
+    if use_orjson():
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def dumps_str(obj):
+    """Encode `obj` to a JSON str (WebSocket text frames)."""
+    return dumps(obj).decode()
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in for JsonResponse on the hot order endpoints."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class FastJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class FeedCache:
+    """
+    Caches a serialized feed response per query string, so every poller
+    after the first gets the same payload without a query or serializer run.
+
+    Entries live in a per-process LRU and, if FEED_CACHE['shared_cache'] is
+    set, in that Django cache as well. invalidate() bumps a generation
+    number (kept in the shared cache when there is one, so every worker
+    sees it) and entries from older generations are never served. `ttl` is
+    only a safety net for writes that bypass invalidate(), e.g. the admin.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.local_generation = 0
+
+    @property
+    def config(self):
+        return getattr(settings, 'FEED_CACHE', {})
+
+    @property
+    def shared(self):
+        alias = self.config.get('shared_cache')
+        return caches[alias] if alias else None
+
+    def _generation(self):
+        if self.shared is not None:
+            return self.shared.get(f'feed:{self.name}:gen', 0)
+        return self.local_generation
+
+    def get(self, params):
+        """
+        (generation, value) for this query string; value is None on a miss.
+        Pass the generation back to set() so a page built from reads taken
+        before an invalidate() is filed under the old generation, not the
+        new one.
+        """
+        generation = self._generation()
+        if not self.config.get('enabled', True):
+            return generation, None
+        key = (generation, params)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                return generation, entry[1]
+        if self.shared is not None:
+            value = self.shared.get(f'feed:{self.name}:{generation}:{params}')
+            if value is not None:
+                self._store_local(key, value)
+            return generation, value
+        return generation, None
+
+    def set(self, params, value, generation):
+        if not self.config.get('enabled', True):
+            return
+        key = (generation, params)
+        self._store_local(key, value)
+        if self.shared is not None:
+            self.shared.set(f'feed:{self.name}:{generation}:{params}', value, timeout=self.config.get('ttl', 60))
+
+    def _store_local(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.config.get('ttl', 60), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.config.get('maxsize', 128):
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.local_generation += 1
+            self.entries.clear()
+        if self.shared is not None:
+            key = f'feed:{self.name}:gen'
+            self.shared.add(key, 0, timeout=None)
+            self.shared.incr(key)
+
+    def invalidate_on_commit(self):
+        transaction.on_commit(self.invalidate)
+
+
+unassigned_feed = FeedCache('unassigned')
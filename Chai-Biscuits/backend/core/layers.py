@@ -0,0 +1,26 @@
+from channels_redis.core import RedisChannelLayer
+
+from .hashring import HashRing
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer that places groups (user_<phone>, orders, ...) and
+    channels on hosts with a consistent hash ring, so growing the Redis
+    pool does not reshuffle every group's membership at once.
+    """
+
+    def __init__(self, *args, ring_replicas=160, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = HashRing([self._host_id(host) for host in self.hosts], ring_replicas)
+
+    @staticmethod
+    def _host_id(host):
+        if isinstance(host, dict):
+            return str(host.get('address') or sorted(host.items()))
+        return str(host)
+
+    def consistent_hash(self, value):
+        if isinstance(value, bytes):
+            value = value.decode()
+        return self.ring.get(value)
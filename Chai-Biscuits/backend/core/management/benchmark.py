@@ -0,0 +1,42 @@
+"""
+Shared bits for the benchmark management commands (bench_*): a scratch
+database to write into and latency formatting.
+"""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def scratch_database():
+    """
+    Create and migrate the default database's TEST database for the
+    duration of a benchmark, then drop it; the real database is never
+    touched.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def timed(func, repeat):
+    """Wall-clock seconds of `repeat` calls to func()."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def ms(latencies, percentile):
+    if not latencies:
+        return '-'
+    if len(latencies) < 2:
+        return f'{latencies[0] * 1000:.2f}ms'
+    return f'{statistics.quantiles(latencies, n=100)[percentile - 1] * 1000:.2f}ms'
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Move delivered/cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the "
+        "archive tables. Schedule it daily, e.g. cron: 0 3 * * * python manage.py archive_orders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive orders placed more than this many days ago")
+        parser.add_argument('--batch-size', type=int, help="Orders moved per transaction")
+
+    def handle(self, *args, **options):
+        moved = archive_orders(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} order(s)"))
@@ -0,0 +1,73 @@
+import json
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from core.management.benchmark import scratch_database, timed, ms
+from core.models import CustomUser, Order, OrderItem
+from core.views import create_order
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark POST /api/create-order/ latency against cart size on a "
+        "scratch database, and its item writes: bulk_create vs one INSERT per item"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,50,200', help="Comma-separated cart sizes (default 1,10,50,200)")
+        parser.add_argument('--repeat', type=int, default=20, help="Orders created per cart size (default 20)")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        with scratch_database():
+            user = CustomUser.objects.create_user(phone_number='9000000001', name='Bench', address='1 Bench Road')
+            self.stdout.write(f"{options['repeat']} orders per cart size:")
+            for size in sizes:
+                items = [
+                    {'item_name': f'Chai {i}', 'quantity': 2, 'price_per_item': '20.00'}
+                    for i in range(size)
+                ]
+                view = timed(lambda: self.post_order(user, items), options['repeat'])
+                bulk = timed(lambda: self.write_order(user, items, bulk=True), options['repeat'])
+                per_item = timed(lambda: self.write_order(user, items, bulk=False), options['repeat'])
+                self.stdout.write(
+                    f"  items={size:<5} create_order p50={ms(view, 50):<10} p99={ms(view, 99):<10} "
+                    f"bulk_create p50={ms(bulk, 50):<10} per-item p50={ms(per_item, 50)}"
+                )
+
+    # ----------------------------
+    # Write paths
+    # ----------------------------
+
+    def post_order(self, user, items):
+        body = json.dumps({'phone_number': user.phone_number, 'total': 40 * len(items), 'items': items})
+        response = create_order(RequestFactory().post('/api/create-order/', body, content_type='application/json'))
+        if response.status_code != 201:
+            raise RuntimeError(response.content.decode())
+
+    def write_order(self, user, items, bulk):
+        """
+        Just the order + items writes, committed: one bulk INSERT as
+        create_order does now, or what it did before, an INSERT per item
+        and then a read-back for the broadcast payload.
+        """
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user, total_amount=Decimal(40 * len(items)), delivery_address=user.address,
+            )
+            rows = [
+                OrderItem(
+                    order=order, item_name=item['item_name'], quantity=item['quantity'],
+                    price_per_item=Decimal(item['price_per_item']),
+                )
+                for item in items
+            ]
+            if bulk:
+                OrderItem.objects.bulk_create(rows)
+            else:
+                for row in rows:
+                    row.save()
+                list(order.items.all())
@@ -0,0 +1,110 @@
+import statistics
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework import serializers
+
+from core.encoders import order_rows, encode_rows
+from core.management.benchmark import scratch_database, timed, ms
+from core.models import CustomUser, DeliveryPartner, Order, OrderItem
+
+
+# ----------------------------
+# Baseline: the DRF serializers the order endpoints used before core/encoders.py
+# ----------------------------
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ['item_name', 'quantity', 'price_per_item', 'total_price']
+
+
+class DeliveryPartnerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryPartner
+        fields = ['id', 'name', 'phone_number']
+
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
+    assigned_to = DeliveryPartnerSerializer(read_only=True)
+    delivery_address = serializers.SerializerMethodField()
+    user = serializers.SerializerMethodField()
+    version = serializers.IntegerField(source='change_seq', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'order_id', 'placed_at', 'out_for_delivery_at', 'delivery_time', 'total_amount',
+            'delivery_status', 'assigned_to', 'items', 'delivery_address', 'user', 'version',
+        ]
+
+    def get_delivery_address(self, obj):
+        return obj.user.address
+
+    def get_user(self, obj):
+        return {'name': obj.user.name, 'phone_number': obj.user.phone_number, 'address': obj.user.address}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark encoding order lists on a scratch database: core.encoders "
+        "(values() rows + plain functions) vs the DRF OrderSerializer it replaced"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', default='10,100,1000', help="Comma-separated list lengths (default 10,100,1000)")
+        parser.add_argument('--items', type=int, default=3, help="Items per order (default 3)")
+        parser.add_argument('--repeat', type=int, default=10, help="Runs per list length (default 10)")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['orders'].split(',')]
+        with scratch_database():
+            self.create_orders(max(sizes), options['items'])
+            self.stdout.write(f"Order lists with {options['items']} items each, queries included:")
+            for size in sizes:
+                pks = list(Order.objects.order_by('-placed_at', '-pk').values_list('pk', flat=True)[:size])
+                drf = timed(lambda: self.drf(pks), options['repeat'])
+                encoders = timed(lambda: self.encoders(pks), options['repeat'])
+                speedup = statistics.median(drf) / statistics.median(encoders)
+                self.stdout.write(
+                    f"  orders={size:<6} DRF p50={ms(drf, 50):<11} encoders p50={ms(encoders, 50):<11} "
+                    f"x{speedup:.1f}"
+                )
+
+    # ----------------------------
+    # Encoding paths
+    # ----------------------------
+
+    def drf(self, pks):
+        orders = (
+            Order.objects.filter(pk__in=pks).order_by('-placed_at', '-pk')
+            .select_related('user', 'assigned_to').prefetch_related('items')
+        )
+        return OrderSerializer(orders, many=True).data
+
+    def encoders(self, pks):
+        return encode_rows(list(order_rows(Order.objects.filter(pk__in=pks).order_by('-placed_at', '-pk'))))
+
+    # ----------------------------
+    # Helpers
+    # ----------------------------
+
+    def create_orders(self, count, items):
+        user = CustomUser.objects.create_user(phone_number='9000000001', name='Bench', address='1 Bench Road')
+        partner = DeliveryPartner.objects.create(phone_number='8000000001', name='Bench', address='2 Bench Road')
+        orders = [
+            Order(
+                user=user, total_amount=Decimal('40.00') * items, delivery_address=user.address,
+                assigned_to=partner if i % 2 else None, delivery_status='assigned' if i % 2 else 'placed',
+            )
+            for i in range(count)
+        ]
+        for order in orders:
+            order.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_name=f'Chai {i}', quantity=2, price_per_item=Decimal('20.00'))
+            for order in orders for i in range(items)
+        ])
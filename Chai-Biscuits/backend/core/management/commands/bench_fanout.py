@@ -0,0 +1,115 @@
+import asyncio
+import json
+import time
+import uuid
+from copy import deepcopy
+from decimal import Decimal
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.encoders import encode_order, encode_item
+from core.management.benchmark import ms
+from core.models import OrderItem
+from core.utils import order_frame
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the cost of fanning one order broadcast out to N WebSocket "
+        "subscribers through an InMemoryChannelLayer group: the frame encoded "
+        "once at publish time vs the order dict re-encoded by every consumer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', default='10,100,500,1000', help="Comma-separated group sizes (default 10,100,500,1000)")
+        parser.add_argument('--items', type=int, default=3, help="Items per order (default 3)")
+        parser.add_argument('--repeat', type=int, default=20, help="Broadcasts per group size (default 20)")
+
+    def handle(self, *args, **options):
+        order = self.order(options['items'])
+        # InMemoryChannelLayer.receive() sweeps every channel for expired
+        # messages, so the 'layer' columns grow with N^2 in both modes;
+        # 'consumer work' is each subscriber's message copy + handler alone
+        self.stdout.write(f"One broadcast of an order with {options['items']} items, publish to last frame sent (p50):")
+        for count in [int(count) for count in options['subscribers'].split(',')]:
+            results = {}
+            for encode_once in (True, False):
+                results[encode_once] = (
+                    asyncio.run(self.through_layer(count, options['repeat'], order, encode_once)),
+                    asyncio.run(self.consumer_work(count, options['repeat'], order, encode_once)),
+                )
+            (layer_once, work_once), (layer_each, work_each) = results[True], results[False]
+            self.stdout.write(
+                f"  subscribers={count:<6} layer: once={ms(layer_once, 50):<10} per-subscriber={ms(layer_each, 50):<10} "
+                f"consumer work: once={ms(work_once, 50):<10} per-subscriber={ms(work_each, 50)}"
+            )
+
+    # ----------------------------
+    # Fan-out
+    # ----------------------------
+
+    def publish(self, order, encode_once):
+        if encode_once:
+            # utils.broadcast_to_groups: encode once, consumers forward the text
+            return {'type': 'order.updated', 'text': order_frame(order)}
+        return {'type': 'order.updated', 'order': order}
+
+    async def handle_event(self, event, encode_once):
+        if encode_once:
+            await self.send(text_data=event['text'])
+            return
+        # Before: every consumer rebuilt the dict and encoded it itself
+        data = event['order']
+        assigned_to = data.get('assigned_to')
+        if assigned_to:
+            data['assigned_to'] = {
+                'name': assigned_to.get('name', 'Unknown'),
+                'phone_number': assigned_to.get('phone_number', ''),
+            }
+        await self.send(text_data=json.dumps({'order': data}))
+
+    async def send(self, text_data):
+        # Stands in for the WebSocket send
+        pass
+
+    async def through_layer(self, count, repeat, order, encode_once):
+        layer = InMemoryChannelLayer(capacity=count * 2)
+        channels = [await layer.new_channel() for _ in range(count)]
+        for channel in channels:
+            await layer.group_add('bench', channel)
+
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await layer.group_send('bench', self.publish(order, encode_once))
+            for channel in channels:
+                await self.handle_event(await layer.receive(channel), encode_once)
+            latencies.append(time.perf_counter() - start)
+        await layer.flush()
+        return latencies
+
+    async def consumer_work(self, count, repeat, order, encode_once):
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            message = self.publish(order, encode_once)
+            for _ in range(count):
+                # Every layer hands each subscriber its own copy of the message
+                await self.handle_event(deepcopy(message), encode_once)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def order(self, items):
+        row = {
+            'order_id': uuid.uuid4(), 'placed_at': timezone.now(), 'out_for_delivery_at': None,
+            'delivery_time': None, 'total_amount': Decimal('40.00') * items,
+            'delivery_status': 'assigned', 'change_seq': 1,
+            'user__name': 'Asha', 'user__phone_number': '9000000001', 'user__address': '12 MG Road',
+            'assigned_to_id': 1, 'assigned_to__name': 'Ravi', 'assigned_to__phone_number': '8000000001',
+        }
+        return encode_order(row, [
+            encode_item(OrderItem(item_name=f'Chai {n}', quantity=2, price_per_item=Decimal('20.00')))
+            for n in range(items)
+        ])
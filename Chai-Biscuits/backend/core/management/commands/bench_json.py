@@ -0,0 +1,92 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core import fastjson
+from core.encoders import encode_order, encode_item
+from core.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark JSON encoding throughput (MB/s) of large order lists: "
+        "core.fastjson with orjson and with the stdlib fallback, vs the "
+        "DRF JSONRenderer and JsonResponse's DjangoJSONEncoder"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help="Orders per list (default 1000)")
+        parser.add_argument('--items', type=int, default=3, help="Items per order (default 3)")
+        parser.add_argument('--seconds', type=float, default=1.0, help="How long to run each encoder (default 1s)")
+
+    def handle(self, *args, **options):
+        encoded = [self.order(i, options['items']) for i in range(options['orders'])]
+        raw = [self.raw_order(i, options['items']) for i in range(options['orders'])]
+        encoders = [
+            ('DRF JSONRenderer', lambda data: JSONRenderer().render(data)),
+            ('DjangoJSONEncoder', lambda data: json.dumps(data, cls=DjangoJSONEncoder).encode()),
+            ('fastjson (stdlib)', self.stdlib_dumps),
+        ]
+        if fastjson.orjson is not None:
+            encoders.append(('fastjson (orjson)', fastjson.dumps))
+        else:
+            self.stdout.write("orjson is not installed; skipping fastjson (orjson)")
+
+        for label, data in (('Encoded order payloads', encoded), ('Raw Decimal/UUID/datetime/timedelta values', raw)):
+            self.stdout.write(f"{label}, {options['orders']} orders x {options['items']} items:")
+            for name, dumps in encoders:
+                size, runs, elapsed = self.throughput(dumps, data, options['seconds'])
+                self.stdout.write(
+                    f"  {name:<18} {size / 1024:>8.1f} KiB/list  {runs / elapsed:>8.1f} lists/s  "
+                    f"{size * runs / elapsed / 1e6:>8.1f} MB/s"
+                )
+
+    # ----------------------------
+    # Helpers
+    # ----------------------------
+
+    def throughput(self, dumps, data, seconds):
+        size = len(dumps(data))
+        runs, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            dumps(data)
+            runs += 1
+        return size, runs, time.perf_counter() - start
+
+    def stdlib_dumps(self, data):
+        with override_settings(JSON_BACKEND='json'):
+            return fastjson.dumps(data)
+
+    def raw_order(self, i, items):
+        return {
+            'order_id': uuid.uuid4(),
+            'placed_at': timezone.now(),
+            'delivery_time': timedelta(minutes=i % 60),
+            'total_amount': Decimal('40.00') * items,
+            'delivery_status': 'placed',
+            'items': [
+                {'item_name': f'Chai {n}', 'quantity': 2, 'price_per_item': Decimal('20.00')}
+                for n in range(items)
+            ],
+        }
+
+    def order(self, i, items):
+        row = {
+            'order_id': uuid.uuid4(), 'placed_at': timezone.now(), 'out_for_delivery_at': None,
+            'delivery_time': timedelta(minutes=i % 60), 'total_amount': Decimal('40.00') * items,
+            'delivery_status': 'assigned', 'change_seq': i,
+            'user__name': 'Asha', 'user__phone_number': '9000000001', 'user__address': '12 MG Road',
+            'assigned_to_id': 1, 'assigned_to__name': 'Ravi', 'assigned_to__phone_number': '8000000001',
+        }
+        return encode_order(row, [
+            encode_item(OrderItem(item_name=f'Chai {n}', quantity=2, price_per_item=Decimal('20.00')))
+            for n in range(items)
+        ])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.otp_store import get_otp_store
+
+
+class Command(BaseCommand):
+    help = "Delete OTP rows older than OTP_TTL (run periodically, e.g. from cron)"
+
+    def handle(self, *args, **options):
+        deleted = get_otp_store().purge()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired OTP(s)"))
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark SQLite under concurrent order writes on a scratch database: "
+        "read latency while a writer holds the lock, and writer failures with "
+        "deferred vs immediate transactions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent writers (default 8)")
+        parser.add_argument('--ops', type=int, default=10, help="Writes per writer thread (default 10)")
+        parser.add_argument('--hold-ms', type=int, default=50, help="How long each write keeps its transaction open")
+
+    def handle(self, *args, **options):
+        hold = options['hold_ms'] / 1000
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+        rollback_journal = {**pragmas, 'journal_mode': 'DELETE'}
+
+        self.stdout.write("Reads while a writer holds the write lock:")
+        for label, config in (('rollback journal', rollback_journal), ('SQLITE_PRAGMAS', pragmas)):
+            latencies, errors = self.read_during_writes(config, hold)
+            self.stdout.write(
+                f"  {label:<17} reads={len(latencies):<5} errors={errors:<4} "
+                f"p50={self.ms(latencies, 50)} p99={self.ms(latencies, 99)}"
+            )
+
+        self.stdout.write(f"{options['threads']} writers x {options['ops']} read-then-write transactions:")
+        for mode in ('DEFERRED', 'IMMEDIATE'):
+            ok, failed, elapsed = self.concurrent_writes(pragmas, mode, options['threads'], options['ops'])
+            self.stdout.write(f"  BEGIN {mode:<10} ok={ok:<4} locked={failed:<4} {elapsed:.2f}s")
+
+    # ----------------------------
+    # Scenarios
+    # ----------------------------
+
+    def read_during_writes(self, pragmas, hold):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.create_db(tmp, pragmas)
+            stop = threading.Event()
+
+            def writer():
+                conn = self.connect(path, pragmas)
+                while not stop.is_set():
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.execute("INSERT INTO orders (status) VALUES ('placed')")
+                    time.sleep(hold)
+                    conn.execute('COMMIT')
+                conn.close()
+
+            thread = threading.Thread(target=writer)
+            thread.start()
+            latencies, errors = [], 0
+            reader = self.connect(path, {**pragmas, 'busy_timeout': 0})
+            deadline = time.monotonic() + 1
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    reader.execute("SELECT count(*) FROM orders WHERE status = 'placed'").fetchone()
+                    latencies.append(time.perf_counter() - start)
+                except sqlite3.OperationalError:
+                    errors += 1
+            reader.close()
+            stop.set()
+            thread.join()
+        return latencies, errors
+
+    def concurrent_writes(self, pragmas, mode, threads, ops):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.create_db(tmp, pragmas)
+            counts = {'ok': 0, 'failed': 0}
+            lock = threading.Lock()
+
+            def worker():
+                conn = self.connect(path, pragmas)
+                for _ in range(ops):
+                    try:
+                        # Same shape as update_order_status: read, then write
+                        conn.execute(f'BEGIN {mode}')
+                        conn.execute("SELECT count(*) FROM orders WHERE status = 'placed'").fetchone()
+                        conn.execute("INSERT INTO orders (status) VALUES ('placed')")
+                        conn.execute('COMMIT')
+                        key = 'ok'
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute('ROLLBACK')
+                        key = 'failed'
+                    with lock:
+                        counts[key] += 1
+                conn.close()
+
+            start = time.perf_counter()
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            return counts['ok'], counts['failed'], time.perf_counter() - start
+
+    # ----------------------------
+    # Helpers
+    # ----------------------------
+
+    def connect(self, path, pragmas):
+        conn = sqlite3.connect(path, isolation_level=None, timeout=0, check_same_thread=False)
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_db(self, tmp, pragmas):
+        path = os.path.join(tmp, 'bench.sqlite3')
+        conn = self.connect(path, pragmas)
+        conn.execute('CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT)')
+        conn.executemany('INSERT INTO orders (status) VALUES (?)', [('delivered',)] * 10000)
+        conn.close()
+        return path
+
+    def ms(self, latencies, percentile):
+        if not latencies:
+            return '-'
+        if len(latencies) < 2:
+            return f'{latencies[0] * 1000:.2f}ms'
+        return f'{statistics.quantiles(latencies, n=100)[percentile - 1] * 1000:.2f}ms'
@@ -0,0 +1,30 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the read replica (local replica setups)"
+
+    def handle(self, *args, **options):
+        alias = replica_alias()
+        if not alias:
+            raise CommandError("No replica configured (set REPLICA_DATABASE_PATH)")
+
+        primary, replica = settings.DATABASES['default'], settings.DATABASES[alias]
+        if 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in replica['ENGINE']:
+            raise CommandError("sync_replica only handles SQLite; use the database's own replication")
+
+        # The online backup API copies a consistent snapshot while the
+        # primary keeps serving reads and writes
+        source = sqlite3.connect(str(primary['NAME']))
+        target = sqlite3.connect(str(replica['NAME']))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Replica '{alias}' synced from primary"))
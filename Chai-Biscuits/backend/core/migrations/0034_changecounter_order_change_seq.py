@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    # ChangeCounter.next_value only UPDATEs, so the row has to exist
+    ChangeCounter = apps.get_model('core', 'ChangeCounter')
+    ChangeCounter.objects.get_or_create(name='order')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_alter_order_delivery_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
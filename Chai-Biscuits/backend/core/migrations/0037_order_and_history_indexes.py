@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_otp_otp_phone_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['placed_at'], name='order_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True)), fields=['placed_at'], name='order_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['assigned_to', 'delivery_status', 'placed_at'], name='order_partner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'placed_at'], name='order_user_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryhistory',
+            index=models.Index(fields=['delivery_partner', 'completed_at'], name='history_partner_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryhistory',
+            index=models.Index(fields=['order', 'status'], name='history_order_status_idx'),
+        ),
+    ]
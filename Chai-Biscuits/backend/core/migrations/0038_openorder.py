@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_queue(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    OpenOrder = apps.get_model('core', 'OpenOrder')
+    open_orders = Order.objects.filter(assigned_to__isnull=True, delivery_status='placed')
+    OpenOrder.objects.bulk_create(
+        OpenOrder(order_id=order.pk, placed_at=order.placed_at)
+        for order in open_orders.only('pk', 'placed_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_order_and_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenOrder',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='open_entry', serialize=False, to='core.order')),
+                ('placed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['placed_at'], name='open_order_placed_idx')],
+            },
+        ),
+        migrations.RunPython(fill_queue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_openorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order_id', models.UUIDField(editable=False, unique=True)),
+                ('placed_at', models.DateTimeField()),
+                ('out_for_delivery_at', models.DateTimeField(blank=True, null=True)),
+                ('delivery_time', models.DurationField(default=datetime.timedelta(0))),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('delivery_status', models.CharField(choices=[('placed', 'Order Placed'), ('assigned', 'Assigned to Delivery Partner'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=30)),
+                ('delivery_address', models.TextField(blank=True, null=True)),
+                ('change_seq', models.BigIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='core.deliverypartner')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='core.customuser')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user', 'placed_at'], name='archived_user_placed_idx'),
+                    models.Index(fields=['placed_at'], name='archived_placed_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_name', models.CharField(max_length=100)),
+                ('quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('price_per_item', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.archivedorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedDeliveryHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('delivery_partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.deliverypartner')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.archivedorder')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['delivery_partner', 'completed_at'], name='archived_partner_done_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def backfill_stats(apps, schema_editor):
+    PartnerDailyStats = apps.get_model('core', 'PartnerDailyStats')
+    rollup = {}
+    for model_name in ('DeliveryHistory', 'ArchivedDeliveryHistory'):
+        history = apps.get_model('core', model_name).objects.filter(
+            completed_at__isnull=False
+        ).select_related('order')
+        for h in history.iterator():
+            key = (h.delivery_partner_id, timezone.localdate(h.completed_at))
+            row = rollup.setdefault(key, {'deliveries': 0, 'cancellations': 0, 'earnings': Decimal(0), 'delivery_seconds': 0})
+            if h.status == 'completed':
+                row['deliveries'] += 1
+                row['earnings'] += h.earnings
+                row['delivery_seconds'] += int((h.completed_at - h.order.placed_at).total_seconds())
+            else:
+                row['cancellations'] += 1
+    PartnerDailyStats.objects.bulk_create(
+        PartnerDailyStats(delivery_partner_id=partner_id, day=day, **row)
+        for (partner_id, day), row in rollup.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_archived_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartnerDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('deliveries', models.PositiveIntegerField(default=0)),
+                ('cancellations', models.PositiveIntegerField(default=0)),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('delivery_seconds', models.BigIntegerField(default=0)),
+                ('delivery_partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.deliverypartner')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('delivery_partner', 'day'), name='partner_day_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_partnerdailystats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='openorder',
+            name='open_order_placed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_unassigned_idx',
+        ),
+        migrations.AddIndex(
+            model_name='openorder',
+            index=models.Index(fields=['placed_at', 'order'], name='open_order_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_open_order_queue_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archiveddeliveryhistory',
+            name='archived_partner_done_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='archivedorder',
+            name='archived_user_placed_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archiveddeliveryhistory',
+            index=models.Index(fields=['delivery_partner', 'completed_at', 'id'], name='archived_partner_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['user', 'placed_at', 'id'], name='archived_user_placed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorderitem',
+            index=models.Index(fields=['order', 'id'], name='archived_item_order_idx'),
+        ),
+    ]
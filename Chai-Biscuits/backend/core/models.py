@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 import uuid
+from decimal import Decimal
 from datetime import timedelta
 
 # ----------------------------
@@ -25,6 +28,7 @@ class CustomUser(AbstractBaseUser):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)  # Required for admin access
     is_superuser = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # ETags for profile and order reads
 
     objects = CustomUserManager()
 
@@ -49,6 +53,11 @@ class OTP(models.Model):
     otp = models.CharField(max_length=4)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone_number', 'created_at'], name='otp_phone_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.phone_number} - OTP: {self.otp}"
 
@@ -62,16 +71,69 @@ class DeliveryPartner(models.Model):
     address = models.TextField()
     is_online = models.BooleanField(default=True)  # Online/Offline toggle
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # ETags for profile and order reads
 
     def __str__(self):
         return f"{self.name} ({self.phone_number})"
 
 
 
+# ----------------------------
+# Change Sequence (delta sync)
+# ----------------------------
+
+class ChangeCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def next_value(cls, name):
+        # UPDATE first: the write lock is taken before anything is read, and
+        # the counter row stays locked until the caller's transaction commits,
+        # so sequence numbers become visible in the order they were handed out
+        with transaction.atomic():
+            counter = cls.objects.filter(name=name)
+            if not counter.update(value=F('value') + 1):
+                # Counter the migrations didn't seed
+                cls.objects.get_or_create(name=name)
+                counter.update(value=F('value') + 1)
+            return counter.values_list('value', flat=True).get()
+
+
 # ----------------------------
 # Order and Items
 # ----------------------------
 
+class OrderQuerySet(models.QuerySet):
+    def claim(self, pk, partner, version=None):
+        """
+        Assign an unassigned order to `partner` with a single conditional
+        UPDATE. Returns False if another partner got there first (or the
+        order changed since `version`, when given).
+        """
+        with transaction.atomic():
+            rows = self.filter(pk=pk, assigned_to__isnull=True, delivery_status='placed')
+            if version is not None:
+                rows = rows.filter(change_seq=version)
+            # No exists() probe first: the UPDATE is the check, and a losing
+            # claim only burns a sequence number
+            claimed = rows.update(
+                assigned_to=partner,
+                delivery_status='assigned',
+                change_seq=ChangeCounter.next_value('order'),
+            ) == 1
+            if claimed:
+                OpenOrder.objects.filter(order_id=pk).delete()
+            return claimed
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('placed', 'Order Placed'),
@@ -91,9 +153,56 @@ class Order(models.Model):
     # Link delivery partner if assigned
     assigned_to = models.ForeignKey(DeliveryPartner, null=True, blank=True, on_delete=models.SET_NULL, related_name='assigned_orders')
 
+    # Bumped on every write; /api/orders/changes/ reads orders past a client's token
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        # One index per listing's filter + keyset order (id rides along as
+        # the rowid on SQLite)
+        indexes = [
+            models.Index(fields=['placed_at'], name='order_placed_idx'),
+            models.Index(fields=['assigned_to', 'delivery_status', 'placed_at'], name='order_partner_status_idx'),
+            models.Index(fields=['user', 'placed_at'], name='order_user_placed_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_seq = ChangeCounter.next_value('order')
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order {self.order_id} for {self.user.name}"
 
+class OpenOrder(models.Model):
+    """
+    Dispatch queue: one row per order that is placed and not yet assigned.
+    Partners read this instead of scanning the whole Order table, so the
+    lookup scales with open orders rather than order history.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='open_entry')
+    placed_at = models.DateTimeField()  # copy of order.placed_at for queue ordering
+
+    class Meta:
+        # The pk is the order column, not SQLite's rowid, so it has to be in
+        # the index for (placed_at, pk) keyset pages to come out presorted
+        indexes = [
+            models.Index(fields=['placed_at', 'order'], name='open_order_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Open order {self.order_id}"
+
+    @classmethod
+    def sync(cls, order):
+        """Add or remove `order` from the queue to match its current state."""
+        if order.assigned_to_id is None and order.delivery_status == 'placed':
+            cls.objects.get_or_create(order=order, defaults={'placed_at': order.placed_at})
+        else:
+            cls.objects.filter(order=order).delete()
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     item_name = models.CharField(max_length=100)
@@ -120,6 +229,12 @@ class DeliveryHistory(models.Model):
     status = models.CharField(max_length=20, choices=[('completed', 'Completed'), ('cancelled', 'Cancelled')])
     earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['delivery_partner', 'completed_at'], name='history_partner_done_idx'),
+            models.Index(fields=['order', 'status'], name='history_order_status_idx'),
+        ]
+
     def time_taken(self):
         if self.order.placed_at and self.completed_at:
             return self.completed_at - self.order.placed_at
@@ -127,3 +242,112 @@ class DeliveryHistory(models.Model):
 
     def __str__(self):
         return f"{self.order.order_id} - {self.delivery_partner.name}"
+
+
+# ----------------------------
+# Partner Stats Rollup
+# ----------------------------
+
+class PartnerDailyStats(models.Model):
+    """
+    Per-partner, per-day totals kept up to date as deliveries are recorded,
+    so stats for any date range are a sum over days instead of a scan of
+    every DeliveryHistory row.
+    """
+    delivery_partner = models.ForeignKey(DeliveryPartner, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    deliveries = models.PositiveIntegerField(default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    delivery_seconds = models.BigIntegerField(default=0)  # sum of time_taken() over deliveries
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['delivery_partner', 'day'], name='partner_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.delivery_partner.name} - {self.day}"
+
+    @classmethod
+    def record(cls, history):
+        """Add one DeliveryHistory row to its partner's day."""
+        day = timezone.localdate(history.completed_at)
+        stats, _ = cls.objects.get_or_create(delivery_partner_id=history.delivery_partner_id, day=day)
+        if history.status == 'completed':
+            changes = {
+                'deliveries': F('deliveries') + 1,
+                'earnings': F('earnings') + Decimal(history.earnings).quantize(Decimal('0.01')),
+                'delivery_seconds': F('delivery_seconds') + int(history.time_taken().total_seconds()),
+            }
+        else:
+            changes = {'cancellations': F('cancellations') + 1}
+        cls.objects.filter(pk=stats.pk).update(**changes)
+
+
+# ----------------------------
+# Archive (see core/archive.py)
+# ----------------------------
+# Delivered/cancelled orders past ORDER_ARCHIVE_AFTER_DAYS are moved here,
+# keeping their ids and field names, so the hot tables stay small and the
+# history views can read both with the same code.
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_orders')
+    order_id = models.UUIDField(unique=True, editable=False)
+    placed_at = models.DateTimeField()
+    out_for_delivery_at = models.DateTimeField(null=True, blank=True)
+    delivery_time = models.DurationField(default=timedelta(0))
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    delivery_status = models.CharField(max_length=30, choices=Order.STATUS_CHOICES)
+    delivery_address = models.TextField(blank=True, null=True)
+    assigned_to = models.ForeignKey(DeliveryPartner, null=True, blank=True, on_delete=models.SET_NULL, related_name='archived_orders')
+    change_seq = models.BigIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'placed_at', 'id'], name='archived_user_placed_idx'),
+            models.Index(fields=['placed_at'], name='archived_placed_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_id} for {self.user.name}"
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    item_name = models.CharField(max_length=100)
+    quantity = models.PositiveIntegerField(null=True, blank=True)
+    price_per_item = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'id'], name='archived_item_order_idx'),
+        ]
+
+    total_price = OrderItem.total_price
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item_name}"
+
+
+class ArchivedDeliveryHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    delivery_partner = models.ForeignKey(DeliveryPartner, on_delete=models.CASCADE)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=[('completed', 'Completed'), ('cancelled', 'Cancelled')])
+    earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['delivery_partner', 'completed_at', 'id'], name='archived_partner_done_idx'),
+        ]
+
+    time_taken = DeliveryHistory.time_taken
+
+    def __str__(self):
+        return f"{self.order.order_id} - {self.delivery_partner.name}"
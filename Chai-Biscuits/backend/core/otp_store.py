@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+
+from .models import OTP
+
+logger = logging.getLogger(__name__)
+
+# Results of OTPStore.verify()
+VALID = 'valid'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+MISSING = 'missing'
+
+
+def otp_ttl():
+    return getattr(settings, 'OTP_TTL', 300)
+
+
+class DatabaseOTPStore:
+    """
+    One OTP row per phone number, looked up through the
+    (phone_number, created_at) index. Rows nobody verified are purged at
+    most once every OTP_PURGE_INTERVAL seconds per process, and by the
+    purge_expired_otps management command.
+    """
+
+    def __init__(self):
+        self._last_purge = 0
+        self._lock = threading.Lock()
+
+    def save(self, phone, otp):
+        OTP.objects.update_or_create(
+            phone_number=phone,
+            defaults={'otp': otp, 'created_at': timezone.now()}
+        )
+        self._maybe_purge()
+
+    def verify(self, phone, otp):
+        record = OTP.objects.filter(phone_number=phone).order_by('-created_at').first()
+        if record is None:
+            return MISSING
+        if timezone.now() - record.created_at > timedelta(seconds=otp_ttl()):
+            return EXPIRED
+        if not constant_time_compare(record.otp, otp):
+            return INVALID
+        record.delete()  # single use
+        return VALID
+
+    def purge(self):
+        cutoff = timezone.now() - timedelta(seconds=otp_ttl())
+        deleted, _ = OTP.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
+
+    def _maybe_purge(self):
+        interval = getattr(settings, 'OTP_PURGE_INTERVAL', 600)
+        with self._lock:
+            if time.monotonic() - self._last_purge < interval:
+                return
+            self._last_purge = time.monotonic()
+        self.purge()
+
+
+class CacheOTPStore:
+    """
+    Keeps OTPs in the OTP_CACHE cache and lets the cache expire them.
+    Entries outlive the TTL by OTP_EXPIRED_GRACE seconds only so a late
+    attempt can still be told 'expired' rather than 'not found'. Falls back
+    to the database store if the cache backend is unavailable.
+
+    OTP_CACHE must be shared by every worker (Redis/Memcached), otherwise
+    an OTP sent through one worker is 'not found' on another.
+    """
+
+    def __init__(self):
+        self.fallback = DatabaseOTPStore()
+        if isinstance(self.cache, LocMemCache):
+            logger.warning(
+                "OTP_CACHE is a per-process LocMemCache; OTPs won't verify across "
+                "workers. Point it at a shared cache or use DatabaseOTPStore."
+            )
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'OTP_CACHE', 'default')]
+
+    def _key(self, phone):
+        return f'otp:{phone}'
+
+    def save(self, phone, otp):
+        timeout = otp_ttl() + getattr(settings, 'OTP_EXPIRED_GRACE', 60)
+        try:
+            self.cache.set(self._key(phone), {'otp': otp, 'created_at': time.time()}, timeout=timeout)
+        except Exception:
+            logger.exception("OTP cache unavailable, saving OTP in the database")
+            self.fallback.save(phone, otp)
+
+    def verify(self, phone, otp):
+        try:
+            entry = self.cache.get(self._key(phone))
+        except Exception:
+            logger.exception("OTP cache unavailable, checking the database")
+            return self.fallback.verify(phone, otp)
+
+        if entry is None:
+            # May have been written to the database while the cache was down
+            return self.fallback.verify(phone, otp)
+        if time.time() - entry['created_at'] > otp_ttl():
+            return EXPIRED
+        if not constant_time_compare(entry['otp'], otp):
+            return INVALID
+        self.cache.delete(self._key(phone))  # single use
+        return VALID
+
+    def purge(self):
+        # The cache expires entries itself; only fallback rows need purging
+        return self.fallback.purge()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_otp_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = import_string(getattr(settings, 'OTP_STORE', 'core.otp_store.DatabaseOTPStore'))()
+        return _store
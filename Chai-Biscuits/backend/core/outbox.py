@@ -0,0 +1,115 @@
+import asyncio
+import itertools
+from collections import OrderedDict
+
+from django.conf import settings
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+
+
+class QueueMetrics:
+    """
+    Process-wide counters for WebSocket send queues, served by
+    /api/ws/metrics/. Only touched from the ASGI event loop.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.queued = 0          # frames waiting across every connection
+        self.max_depth = 0       # deepest single queue seen
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = 0
+
+    def snapshot(self):
+        return dict(vars(self))
+
+
+metrics = QueueMetrics()
+
+
+class SendQueue:
+    """
+    Bounded queue of outgoing text frames for one WebSocket connection.
+    The consumer puts frames and returns straight away; a writer task
+    drains them through `send`, so a slow client backs up here (at most
+    `maxsize` frames) instead of in the channel layer or the server.
+
+    When the queue is full, `policy` decides what gives:
+      drop_oldest - discard the oldest queued frame
+      coalesce    - a frame for an order that is already queued replaces
+                    it in place; otherwise fall back to drop_oldest
+      disconnect  - put() returns False and the consumer closes the socket
+
+    With a coalescing `window` (seconds), the writer waits that long after
+    the first frame of a burst before sending, and frames for the same
+    order always replace the pending one whatever the policy, so an order
+    that goes placed -> assigned -> delivered within the window costs one
+    frame carrying the final state.
+    """
+
+    def __init__(self, send, maxsize=None, policy=None, window=None):
+        config = getattr(settings, 'WS_SEND_QUEUE', {})
+        self.send = send
+        self.maxsize = maxsize or config.get('maxsize', 100)
+        self.policy = policy or config.get('policy', COALESCE)
+        self.window = config.get('coalesce_window', 0) if window is None else window
+        self.frames = OrderedDict()
+        self.ready = asyncio.Event()
+        self.ids = itertools.count()
+        self.task = None
+        self.closed = False
+        metrics.connections += 1
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def put(self, text, key=None):
+        """Queue a frame; `key` (an order_id) lets later frames replace it."""
+        if key is not None and (self.policy == COALESCE or self.window):
+            key = ('order', key)
+            if key in self.frames:
+                self.frames[key] = text
+                metrics.coalesced += 1
+                return True
+        else:
+            key = ('frame', next(self.ids))
+
+        if len(self.frames) >= self.maxsize:
+            if self.policy == DISCONNECT:
+                metrics.disconnected += 1
+                return False
+            self.frames.popitem(last=False)
+            metrics.queued -= 1
+            metrics.dropped += 1
+
+        self.frames[key] = text
+        metrics.queued += 1
+        metrics.max_depth = max(metrics.max_depth, len(self.frames))
+        self.ready.set()
+        return True
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            if self.window:
+                await asyncio.sleep(self.window)
+            while self.frames:
+                _, text = self.frames.popitem(last=False)
+                metrics.queued -= 1
+                await self.send(text_data=text)
+                metrics.sent += 1
+            self.ready.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+        metrics.queued -= len(self.frames)
+        metrics.connections -= 1
+        self.frames.clear()
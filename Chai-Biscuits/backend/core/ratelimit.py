@@ -0,0 +1,128 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+
+# ----------------------------
+# Token bucket backends
+# ----------------------------
+
+class LocalBackend:
+    """
+    Token buckets in process memory. Each check is O(1); the least recently
+    used buckets are dropped beyond RATE_LIMIT_MAX_KEYS so memory stays
+    bounded however many phones/IPs show up.
+    """
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.max_keys = getattr(settings, 'RATE_LIMIT_MAX_KEYS', 100000)
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        """Take one token. Returns 0 if allowed, else seconds until a token frees up."""
+        now = time.monotonic()
+        rate = capacity / period
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / rate
+
+
+class CacheBackend:
+    """
+    Token buckets in a Django cache (RATE_LIMIT_CACHE) shared by every
+    worker. The read-modify-write is not atomic, so concurrent requests for
+    the same key can occasionally let one extra request through.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+    def consume(self, key, capacity, period):
+        now = time.time()
+        rate = capacity / period
+        cache_key = f'rl:{key}'
+        tokens, last = self.cache.get(cache_key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - last) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.cache.set(cache_key, (tokens, now), timeout=math.ceil(period))
+        return 0 if allowed else (1 - tokens) / rate
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(getattr(settings, 'RATE_LIMIT_BACKEND', 'core.ratelimit.LocalBackend'))()
+        return _backend
+
+
+# ----------------------------
+# View decorator
+# ----------------------------
+
+def client_ip(request):
+    if getattr(settings, 'RATE_LIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def request_phone(request):
+    try:
+        return json.loads(request.body).get('phone_number')
+    except (ValueError, AttributeError):
+        return None
+
+
+def rate_limit(scope):
+    """
+    Reject a request with 429 before the view runs if the caller's IP or
+    the phone number in the JSON body has used up its bucket for `scope`.
+    Limits come from RATE_LIMITS[scope], e.g. {'ip': (10, 60), 'phone': (3, 60)}
+    meaning 10 requests per 60s per IP and 3 per 60s per phone.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limits = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+            if limits and getattr(settings, 'RATE_LIMIT_ENABLED', True):
+                keys = {'ip': client_ip(request)}
+                if 'phone' in limits:
+                    keys['phone'] = request_phone(request)
+
+                backend = get_backend()
+                for kind, (capacity, period) in limits.items():
+                    if not keys.get(kind):
+                        continue
+                    wait = backend.consume(f'{scope}:{kind}:{keys[kind]}', capacity, period)
+                    if wait:
+                        response = JsonResponse({'error': 'Too many requests, please try again later'}, status=429)
+                        response['Retry-After'] = str(math.ceil(wait))
+                        return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,107 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ReplayLog:
+    """
+    Per-group sequence numbers and a ring buffer of the last
+    WS_REPLAY['size'] order frames for each WebSocket group, so a client
+    that reconnects with ?epoch=&last_seq= gets only the events it missed.
+
+    Counters and slots live in the WS_REPLAY['cache'] Django cache: with a
+    shared cache every worker numbers a group's events from the same
+    counter. Slot seq % size is overwritten as the sequence wraps, so a
+    gap longer than the buffer is detected and the client is told to
+    resync instead.
+
+    A cache can also lose the counter itself (eviction, culling, restart),
+    after which numbering starts again from 1. Every numbering run gets
+    its own epoch, a random token sent alongside each seq, and a position
+    from another epoch always means resync, never "the same seq again".
+    """
+
+    @property
+    def config(self):
+        return getattr(settings, 'WS_REPLAY', {})
+
+    @property
+    def cache(self):
+        return caches[self.config.get('cache', 'ws_replay')]
+
+    @property
+    def size(self):
+        return self.config.get('size', 200)
+
+    def _seq_key(self, group_name):
+        return f'replay:{group_name}:seq'
+
+    def _epoch_key(self, group_name):
+        return f'replay:{group_name}:epoch'
+
+    def _slot_key(self, group_name, seq):
+        return f'replay:{group_name}:{seq % self.size}'
+
+    def _epoch(self, group_name):
+        key = self._seq_key(group_name)
+        if self.cache.add(key, 0, timeout=None):
+            # First event, or the counter was lost: numbering restarts, so does the epoch
+            self.cache.set(self._epoch_key(group_name), uuid.uuid4().hex[:12], timeout=None)
+        epoch = self.cache.get(self._epoch_key(group_name))
+        if epoch is None:
+            # The epoch was evicted on its own; nobody can resume across it either
+            self.cache.add(self._epoch_key(group_name), uuid.uuid4().hex[:12], timeout=None)
+            epoch = self.cache.get(self._epoch_key(group_name))
+        return epoch
+
+    def append(self, group_name, order_id, delivery_status, text):
+        """
+        Number a '{"order": ...}' frame for this group. Returns
+        (epoch, seq, frame) with "stream", "epoch" and "seq" spliced into
+        the frame; epoch and seq are None when replay is disabled and the
+        frame is returned unchanged.
+        """
+        if not self.config.get('enabled', True):
+            return None, None, text
+        epoch = self._epoch(group_name)
+        seq = self.cache.incr(self._seq_key(group_name))
+        frame = f'{{"stream":"{group_name}","epoch":"{epoch}","seq":{seq},' + text[1:]
+        self.cache.set(
+            self._slot_key(group_name, seq),
+            (epoch, seq, order_id, delivery_status, frame),
+            timeout=self.config.get('ttl', 3600),
+        )
+        return epoch, seq, frame
+
+    def current(self, group_name):
+        """(epoch, seq) of the group's latest event; epoch is None before the first one."""
+        found = self.cache.get_many([self._epoch_key(group_name), self._seq_key(group_name)])
+        return found.get(self._epoch_key(group_name)), found.get(self._seq_key(group_name), 0)
+
+    def since(self, group_name, epoch, last_seq):
+        """
+        (epoch, current_seq, [(seq, order_id, delivery_status, frame), ...])
+        for the events after (epoch, last_seq), or None if the epoch has
+        changed or any of them are gone.
+        """
+        current_epoch, current = self.current(group_name)
+        if epoch is None and last_seq == 0:
+            # Connected before the group had any numbered event: all of this epoch is new to it
+            epoch = current_epoch
+        if epoch != current_epoch:
+            return None
+        if last_seq < 0 or last_seq > current or current - last_seq > self.size:
+            return None
+        seqs = range(last_seq + 1, current + 1)
+        found = self.cache.get_many([self._slot_key(group_name, seq) for seq in seqs])
+        events = []
+        for seq in seqs:
+            entry = found.get(self._slot_key(group_name, seq))
+            if entry is None or entry[:2] != (epoch, seq):
+                return None
+            events.append(entry[1:])
+        return epoch, current, events
+
+
+replay_log = ReplayLog()
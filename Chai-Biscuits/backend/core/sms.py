@@ -0,0 +1,121 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+
+class BaseSMSBackend:
+    def send_otp(self, phone, otp):
+        raise NotImplementedError
+
+
+class TwoFactorBackend(BaseSMSBackend):
+    """
+    2factor.in OTP API over one pooled keep-alive session, with bounded
+    timeouts and retries (exponential backoff) on connection errors and 5xx.
+    """
+    url = 'https://2factor.in/API/V1/{api_key}/SMS/{phone}/{otp}'
+
+    def __init__(self):
+        if not getattr(settings, 'TWOFACTOR_API_KEY', None):
+            raise ImproperlyConfigured("TwoFactorBackend needs the TWOFACTOR_API_KEY environment variable")
+        retry = Retry(
+            total=getattr(settings, 'SMS_MAX_RETRIES', 3),
+            backoff_factor=getattr(settings, 'SMS_BACKOFF', 0.5),
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+        )
+        adapter = HTTPAdapter(pool_maxsize=getattr(settings, 'SMS_WORKERS', 4), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.timeout = getattr(settings, 'SMS_TIMEOUT', (3, 5))
+
+    def send_otp(self, phone, otp):
+        url = self.url.format(api_key=settings.TWOFACTOR_API_KEY, phone=phone, otp=otp)
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+
+class LocMemBackend(BaseSMSBackend):
+    """Keeps messages in memory instead of sending them (tests / local dev)."""
+    outbox = []
+
+    def send_otp(self, phone, otp):
+        self.outbox.append({'phone_number': phone, 'otp': otp})
+        return 'queued locally'
+
+
+class ConsoleBackend(BaseSMSBackend):
+    def send_otp(self, phone, otp):
+        print(f"[SMS] OTP {otp} for {phone}")
+        return 'printed'
+
+
+# ----------------------------
+# Dispatch
+# ----------------------------
+
+_backend = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = import_string(settings.SMS_BACKEND)()
+        return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    # override_settings(SMS_BACKEND=...) in tests
+    global _backend
+    if setting in ('SMS_BACKEND', 'TWOFACTOR_API_KEY'):
+        with _lock:
+            _backend = None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SMS_WORKERS', 4), thread_name_prefix='sms'
+            )
+        return _executor
+
+
+def _deliver(phone, otp):
+    try:
+        result = get_backend().send_otp(phone, otp)
+        logger.info("OTP sent to %s: %s", phone, result)
+    except Exception:
+        logger.exception("Sending OTP to %s failed", phone)
+
+
+def send_otp_sms(phone, otp):
+    """
+    Hand the OTP to the configured SMS backend. With SMS_ASYNC (default)
+    this returns immediately and delivery happens on a worker thread, so
+    provider latency never holds up the request; the Future is returned.
+    """
+    if getattr(settings, 'SMS_ASYNC', True):
+        return _get_executor().submit(_deliver, phone, otp)
+    _deliver(phone, otp)
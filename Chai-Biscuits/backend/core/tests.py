@@ -1,3 +1,1094 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, transaction, OperationalError
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .routing import websocket_urlpatterns
+from .utils import broadcast_to_groups, notify_partner_status, partner_group, UNASSIGNED_GROUP
+from .feed_cache import FeedCache, unassigned_feed
+from .encoders import encode_order_by_pk
+from .otp_store import DatabaseOTPStore
+from .sms import LocMemBackend, TwoFactorBackend, send_otp_sms
+from .hashring import HashRing
+from . import db as replica_db
+from .db import mark_recent_write, read_from_replica
+from .replay import replay_log
+from .outbox import SendQueue, DROP_OLDEST, COALESCE, DISCONNECT, metrics as ws_queue_metrics
+from .models import (
+    CustomUser, DeliveryPartner, Order, OrderItem, OpenOrder, DeliveryHistory, ChangeCounter,
+    PartnerDailyStats, ArchivedOrder, ArchivedDeliveryHistory,
+)
+
+
+try:
+    from .layers import ShardedRedisChannelLayer
+except ImportError:  # channels_redis is optional
+    ShardedRedisChannelLayer = None
+
+
+def make_user(phone='9000000001'):
+    return CustomUser.objects.create_user(phone_number=phone, name='Asha', address='12 MG Road')
+
+
+def make_partner(phone='8000000001'):
+    return DeliveryPartner.objects.create(phone_number=phone, name='Ravi', address='4 Park Street')
+
+
+def run_threads(target, count):
+    """Run `target` in `count` threads, each closing its own DB connection."""
+    def run():
+        try:
+            target()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def make_order(user, partner=None, status='placed', items=2):
+    order = Order.objects.create(
+        user=user, total_amount=Decimal('120.00'), assigned_to=partner,
+        delivery_status=status, delivery_address=user.address,
+    )
+    for i in range(items):
+        OrderItem.objects.create(order=order, item_name=f'Chai {i}', quantity=2, price_per_item=Decimal('20.00'))
+    OpenOrder.sync(order)
+    return order
+
+
+def make_order_mix(user, partner, count):
+    """
+    `count` rounds of one open, one assigned and one delivered order (with
+    delivery history, every other one not yet completed) for the list views.
+    """
+    for i in range(count):
+        make_order(user)
+        make_order(user, partner, status='assigned')
+        order = make_order(user, partner, status='delivered')
+        DeliveryHistory.objects.create(
+            delivery_partner=partner, order=order, status='completed',
+            completed_at=None if i % 2 else timezone.now(), earnings=Decimal('10.00'),
+        )
+
+
+class CreateOrderBroadcastTests(TestCase):
+    def test_broadcast_payload_matches_a_fresh_read(self):
+        user = make_user()
+        body = json.dumps({
+            'phone_number': user.phone_number,
+            'total': 90,
+            'items': [
+                {'item_name': 'Chai', 'quantity': 2, 'price_per_item': 20},
+                {'item_name': 'Biscuit', 'quantity': 1, 'price_per_item': '50.00'},
+            ],
+        })
+        with mock.patch('core.views.broadcast_to_groups') as broadcast:
+            response = self.client.post('/api/create-order/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(order_id=response.json()['order_id'])
+        payloads = [call.args[2] for call in broadcast.call_args_list]
+        self.assertEqual(len(payloads), 2)
+        for payload in payloads:
+            self.assertEqual(payload, encode_order_by_pk(order.pk))
+
+
+class DeliveryHistoryViewTests(TestCase):
+    def test_history_uses_the_shared_order_shape(self):
+        user, partner = make_user(), make_partner()
+        order = make_order(user, partner, status='delivered')
+        DeliveryHistory.objects.create(
+            delivery_partner=partner, order=order, completed_at=timezone.now(),
+            status='completed', earnings=Decimal('12.00'),
+        )
+
+        response = self.client.get('/api/orders/history/', {'phone': partner.phone_number})
+
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()
+        self.assertEqual(row['order_id'], str(order.order_id))
+        self.assertEqual(row['delivery_status'], 'delivered')
+        self.assertTrue(row['completed_at'].endswith('Z'))
+        self.assertTrue(row['placed_at'].endswith('Z'))
+        self.assertEqual(row['earnings'], '12.00')
+        self.assertEqual(row['assigned_to']['id'], partner.id)
+        self.assertEqual(row['version'], order.change_seq)
+        self.assertEqual(len(row['items']), 2)
+
+
+@override_settings(FEED_CACHE={'enabled': False})
+class OrderListQueryCountTests(TestCase):
+    """Each list endpoint costs the same number of queries for N orders as for 2N."""
+
+    def setUp(self):
+        self.user, self.partner = make_user(), make_partner()
+
+    def get(self, path, params, expected_rows):
+        response = self.client.get(path, {**params, 'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), expected_rows)
+
+    def assertQueriesDoNotGrow(self, path, params, per_batch):
+        make_order_mix(self.user, self.partner, 3)
+        with CaptureQueriesContext(connection) as queries:
+            self.get(path, params, 3 * per_batch)
+        make_order_mix(self.user, self.partner, 3)
+        with self.assertNumQueries(len(queries)):
+            self.get(path, params, 6 * per_batch)
+
+    def test_all_orders(self):
+        self.assertQueriesDoNotGrow('/api/orders/all/', {}, per_batch=3)
+
+    def test_unassigned_orders(self):
+        self.assertQueriesDoNotGrow('/api/orders/unassigned/', {}, per_batch=1)
+
+    def test_assigned_orders(self):
+        self.assertQueriesDoNotGrow('/api/orders/assigned/', {'phone': self.partner.phone_number}, per_batch=1)
+
+    def test_user_order_history(self):
+        self.assertQueriesDoNotGrow('/api/order-history/', {'phone': self.user.phone_number}, per_batch=3)
+
+    def test_delivery_history(self):
+        self.assertQueriesDoNotGrow('/api/orders/history/', {'phone': self.partner.phone_number}, per_batch=1)
+
+
+@override_settings(FEED_CACHE={'enabled': False})
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN QUERY PLAN for every query on the hot read paths: tables are
+    reached through an index (a SCAN must walk one) and nothing is sorted
+    in a temp B-tree.
+    """
+
+    def setUp(self):
+        self.user, self.partner = make_user(), make_partner()
+        make_order_mix(self.user, self.partner, 3)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[3] for row in cursor.fetchall()]
+
+    def assertIndexedPlans(self, queries):
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            for step in self.plan(sql):
+                self.assertNotIn('TEMP B-TREE', step, sql)
+                if step.startswith('SCAN'):
+                    self.assertIn('INDEX', step, sql)
+
+    def fetch_page(self, path, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, {**params, 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedPlans(queries)
+        return response.headers.get('X-Next-Cursor')
+
+    def assertPagesUseIndexes(self, path, params):
+        # The first page and one reached through a cursor
+        cursor = self.fetch_page(path, params)
+        self.assertTrue(cursor)
+        self.fetch_page(path, {**params, 'cursor': cursor})
+
+    def test_all_orders(self):
+        self.assertPagesUseIndexes('/api/orders/all/', {})
+
+    def test_unassigned_orders(self):
+        self.assertPagesUseIndexes('/api/orders/unassigned/', {})
+
+    def test_assigned_orders(self):
+        self.assertPagesUseIndexes('/api/orders/assigned/', {'phone': self.partner.phone_number})
+
+    def test_user_order_history(self):
+        self.assertPagesUseIndexes('/api/order-history/', {'phone': self.user.phone_number})
+
+    def test_delivery_history(self):
+        self.assertPagesUseIndexes('/api/orders/history/', {'phone': self.partner.phone_number})
+
+    def test_history_status_probe(self):
+        order = Order.objects.filter(delivery_status='delivered').first()
+        with CaptureQueriesContext(connection) as queries:
+            DeliveryHistory.objects.filter(order=order, status='completed').exists()
+        self.assertIndexedPlans(queries)
+        self.assertIn('history_order_status_idx', ' '.join(self.plan(queries[0]['sql'])))
+
+    def test_otp_lookup(self):
+        store = DatabaseOTPStore()
+        store.save(self.user.phone_number, '123456')
+        with CaptureQueriesContext(connection) as queries:
+            store.verify(self.user.phone_number, '000000')
+        self.assertIndexedPlans(queries)
+        self.assertIn('otp_phone_created_idx', ' '.join(self.plan(queries[0]['sql'])))
+
+
+class ArchiveOrdersTests(TestCase):
+    def setUp(self):
+        self.user, self.partner = make_user(), make_partner()
+        self.delivered = make_order(self.user, self.partner, status='delivered')
+        self.cancelled = make_order(self.user, status='cancelled', items=1)
+        self.recent = make_order(self.user, self.partner, status='delivered')
+        self.open = make_order(self.user)
+        DeliveryHistory.objects.create(
+            delivery_partner=self.partner, order=self.delivered, completed_at=timezone.now(),
+            status='completed', earnings=Decimal('30.00'),
+        )
+        # Age everything but self.recent past ORDER_ARCHIVE_AFTER_DAYS
+        Order.objects.exclude(pk=self.recent.pk).update(placed_at=timezone.now() - timedelta(days=120))
+
+    def archive(self, **options):
+        call_command('archive_orders', stdout=StringIO(), **options)
+
+    def test_moves_old_finished_orders_with_items_and_history(self):
+        items = {order.pk: list(order.items.values_list('pk', 'item_name')) for order in (self.delivered, self.cancelled)}
+        self.archive(batch_size=1)  # one order per transaction, looping until done
+
+        archived = ArchivedOrder.objects.in_bulk()
+        self.assertEqual(set(archived), {self.delivered.pk, self.cancelled.pk})
+        self.assertEqual(archived[self.delivered.pk].order_id, self.delivered.order_id)
+        for pk, expected in items.items():
+            self.assertEqual(list(archived[pk].items.values_list('pk', 'item_name')), expected)
+        history = ArchivedDeliveryHistory.objects.get()
+        self.assertEqual((history.order_id, history.earnings), (self.delivered.pk, Decimal('30.00')))
+
+        # Hot tables keep only the recent and the still open orders
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.recent.pk, self.open.pk})
+        self.assertFalse(OrderItem.objects.filter(order_id__in=items).exists())
+        self.assertFalse(DeliveryHistory.objects.exists())
+        self.assertTrue(OpenOrder.objects.filter(order=self.open).exists())
+
+    def test_archived_orders_are_still_served(self):
+        self.archive()
+
+        response = self.client.get('/api/order-history/', {'phone': self.user.phone_number})
+        self.assertEqual(response.status_code, 200)
+        orders = {order['order_id']: order for order in response.json()}
+        self.assertEqual(set(orders), {str(o.order_id) for o in (self.delivered, self.cancelled, self.recent, self.open)})
+        self.assertEqual(len(orders[str(self.delivered.order_id)]['items']), 2)
+
+        response = self.client.get('/api/orders/history/', {'phone': self.partner.phone_number})
+        self.assertEqual(response.status_code, 200)
+        [entry] = response.json()
+        self.assertEqual((entry['order_id'], entry['earnings']), (str(self.delivered.order_id), '30.00'))
+        self.assertEqual(len(entry['items']), 2)
+
+        response = self.client.get(f'/api/orders/{self.cancelled.order_id}/status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['delivery_status'], 'cancelled')
+        self.assertEqual(len(response.json()['items']), 1)
+
+
+@override_settings(SMS_BACKEND='core.sms.LocMemBackend', SMS_ASYNC=False)
+class OTPStoreTests(TestCase):
+    def setUp(self):
+        LocMemBackend.outbox.clear()
+
+    def test_otp_sent_through_one_worker_verifies_on_another(self):
+        user = make_user()
+        with mock.patch('core.views.generate_otp', return_value='4321'):
+            response = self.client.post(
+                '/api/send-otp/', json.dumps({'phone_number': user.phone_number, 'name': user.name}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(LocMemBackend.outbox, [{'phone_number': user.phone_number, 'otp': '4321'}])
+
+        # The verifying worker has its own, empty, per-process caches
+        for cache in caches.all():
+            cache.clear()
+
+        response = self.client.post(
+            '/api/verify-otp/', json.dumps({'phone_number': user.phone_number, 'name': user.name, 'otp': '4321'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['phone_number'], user.phone_number)
+
+
+class ThreadRecordingBackend(LocMemBackend):
+    def send_otp(self, phone, otp):
+        self.outbox.append({'phone_number': phone, 'otp': otp, 'thread': threading.current_thread().name})
+        return 'queued locally'
+
+
+class FailingBackend(LocMemBackend):
+    def send_otp(self, phone, otp):
+        raise ConnectionError('provider down')
+
+
+class SMSTests(SimpleTestCase):
+    def setUp(self):
+        LocMemBackend.outbox.clear()
+
+    @override_settings(SMS_BACKEND='core.tests.ThreadRecordingBackend', SMS_ASYNC=True)
+    def test_async_send_is_delivered_on_the_pool(self):
+        future = send_otp_sms('9000000001', '4321')
+        future.result(timeout=5)
+        [message] = LocMemBackend.outbox
+        self.assertEqual((message['phone_number'], message['otp']), ('9000000001', '4321'))
+        self.assertTrue(message['thread'].startswith('sms'))
+
+    @override_settings(SMS_BACKEND='core.tests.FailingBackend', SMS_ASYNC=True)
+    def test_provider_errors_are_logged_not_raised(self):
+        with self.assertLogs('core.sms', 'ERROR'):
+            send_otp_sms('9000000001', '4321').result(timeout=5)
+
+    @override_settings(SMS_BACKEND='core.sms.LocMemBackend', SMS_ASYNC=False)
+    def test_sync_send(self):
+        self.assertIsNone(send_otp_sms('9000000001', '4321'))
+        self.assertEqual(LocMemBackend.outbox, [{'phone_number': '9000000001', 'otp': '4321'}])
+
+    @override_settings(TWOFACTOR_API_KEY=None)
+    def test_two_factor_needs_an_api_key(self):
+        with self.assertRaises(ImproperlyConfigured):
+            TwoFactorBackend()
+
+    @override_settings(TWOFACTOR_API_KEY='test-key', SMS_TIMEOUT=(1, 2))
+    def test_two_factor_request(self):
+        backend = TwoFactorBackend()
+        with mock.patch.object(backend.session, 'get') as get:
+            get.return_value.text = 'ok'
+            self.assertEqual(backend.send_otp('9000000001', '4321'), 'ok')
+        get.assert_called_once_with('https://2factor.in/API/V1/test-key/SMS/9000000001/4321', timeout=(1, 2))
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    def journal_mode(self, path):
+        default = connections['default']
+        wrapper = default.__class__({**default.settings_dict, 'NAME': path}, 'pragma_test')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                return cursor.fetchone()[0]
+        finally:
+            wrapper.close()
+
+    def test_fixture_database_is_not_switched_to_wal(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        fixture, working = f'{location}/fixture.sqlite3', f'{location}/working.sqlite3'
+        with override_settings(SQLITE_FIXTURE_DATABASE=fixture):
+            self.assertEqual(self.journal_mode(fixture), 'delete')
+            self.assertEqual(self.journal_mode(working), 'wal')
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def routed(self, phone):
+        """Whether read_from_replica sends this ?phone= caller's reads to the replica."""
+        view = read_from_replica(lambda request: replica_db._replica_reads.get())
+        return view(RequestFactory().get('/', {'phone': phone}))
+
+    def shared_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        return override_settings(
+            REPLICA_DATABASE='default', REPLICA_STICKY_CACHE='sticky',
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'sticky': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            },
+        )
+
+    def test_recent_writer_is_pinned_to_the_primary(self):
+        with self.shared_cache():
+            self.assertTrue(self.routed('9000000001'))
+            mark_recent_write('9000000001')
+            self.assertFalse(self.routed('9000000001'))
+            self.assertTrue(self.routed('9000000002'))
+
+    @override_settings(REPLICA_DATABASE='default', REPLICA_STICKY_CACHE='default')
+    def test_per_process_sticky_cache_keeps_reads_on_the_primary(self):
+        with mock.patch.object(replica_db, '_warned', False), self.assertLogs('core.db', 'WARNING') as logs:
+            self.assertIsNone(replica_db.replica_alias())
+            self.assertFalse(self.routed('9000000001'))
+        self.assertEqual(len(logs.records), 1)  # warned once, not per request
+
+
+class PartnerStatsTests(TestCase):
+    def test_earnings_are_returned_to_the_cent(self):
+        user, partner = make_user(), make_partner()
+        for earnings in ('10.05', '2.10'):
+            order = make_order(user, partner, status='delivered', items=0)
+            PartnerDailyStats.record(DeliveryHistory.objects.create(
+                delivery_partner=partner, order=order, completed_at=timezone.now(),
+                status='completed', earnings=Decimal(earnings),
+            ))
+
+        response = self.client.get('/api/partner/stats/', {'phone': partner.phone_number})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deliveries'], 2)
+        self.assertEqual(response.json()['earnings'], '12.15')
+
+    def test_no_deliveries_earn_zero(self):
+        partner = make_partner()
+        response = self.client.get('/api/partner/stats/', {'phone': partner.phone_number})
+        self.assertEqual(response.json()['earnings'], '0.00')
+
+
+class CursorPaginationTests(TestCase):
+    def walk(self, path, params):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(path, {**params, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [row['order_id'] for row in response.json()]
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                return seen
+
+    def test_history_pages_cover_ties_and_nulls_once_in_order(self):
+        user, partner = make_user(), make_partner()
+        now = timezone.now()
+        done = [now, now, now - timezone.timedelta(hours=1), None, None]
+        history = []
+        for completed_at in done:
+            order = make_order(user, partner, status='delivered', items=0)
+            history.append(DeliveryHistory.objects.create(
+                delivery_partner=partner, order=order, completed_at=completed_at, status='completed',
+            ))
+
+        expected = sorted(
+            (h for h in history if h.completed_at), key=lambda h: (h.completed_at, h.pk), reverse=True,
+        ) + sorted((h for h in history if not h.completed_at), key=lambda h: h.pk, reverse=True)
+
+        seen = self.walk('/api/orders/history/', {'phone': partner.phone_number, 'page_size': 2})
+        self.assertEqual(seen, [str(h.order.order_id) for h in expected])
+
+    @override_settings(ORDER_PAGE_SIZE=2)
+    def test_unpaginated_request_gets_every_order(self):
+        user, partner = make_user(), make_partner()
+        for _ in range(3):
+            make_order(user, partner, status='assigned', items=0)
+            order = make_order(user, partner, status='delivered', items=0)
+            DeliveryHistory.objects.create(delivery_partner=partner, order=order, status='completed')
+
+        for path, params, count in (
+            ('/api/orders/all/', {}, 6),
+            ('/api/orders/assigned/', {'phone': partner.phone_number}, 3),
+            ('/api/orders/history/', {'phone': partner.phone_number}, 3),
+            ('/api/order-history/', {'phone': user.phone_number}, 6),
+        ):
+            response = self.client.get(path, params)
+            self.assertEqual(len(response.json()), count, path)
+            self.assertNotIn('X-Next-Cursor', response.headers)
+        # Asking for pages still pages
+        self.assertIn('X-Next-Cursor', self.client.get('/api/orders/all/', {'cursor': ''}).headers)
+
+    def test_order_pages_cover_every_order_once(self):
+        user = make_user()
+        orders = [make_order(user, items=0) for _ in range(7)]
+        seen = self.walk('/api/orders/all/', {'page_size': 3})
+        self.assertEqual(seen, [str(o.order_id) for o in reversed(orders)])
+
+
+class ProfileRevalidationTests(TestCase):
+    """Orders embed the customer's and partner's profile; editing either must change the ETag."""
+
+    def setUp(self):
+        self.user, self.partner = make_user(), make_partner()
+        self.order = make_order(self.user, self.partner, status='assigned')
+
+    def assertProfileEditRevalidates(self, path, params, edit, check):
+        first = self.client.get(path, params)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(path, params, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            edit()
+        response = self.client.get(path, params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        check(response.json())
+
+    def update_address(self):
+        response = self.client.post(
+            '/api/update-user-profile/',
+            json.dumps({'phone_number': self.user.phone_number, 'address': 'NEW ADDRESS'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def rename_partner(self):
+        response = self.client.post(
+            '/api/delivery-partner/update-profile/',
+            json.dumps({'phone_number': self.partner.phone_number, 'name': 'Ravi K'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_history_after_address_change(self):
+        self.assertProfileEditRevalidates(
+            '/api/order-history/', {'phone': self.user.phone_number}, self.update_address,
+            lambda rows: self.assertEqual(rows[0]['user']['address'], 'NEW ADDRESS'),
+        )
+
+    def test_assigned_orders_after_partner_rename(self):
+        self.assertProfileEditRevalidates(
+            '/api/orders/assigned/', {'phone': self.partner.phone_number}, self.rename_partner,
+            lambda rows: self.assertEqual(rows[0]['assigned_to']['name'], 'Ravi K'),
+        )
+
+    def test_order_status_after_address_change(self):
+        self.assertProfileEditRevalidates(
+            f'/api/orders/{self.order.order_id}/status/', {}, self.update_address,
+            lambda order: self.assertEqual(order['user']['address'], 'NEW ADDRESS'),
+        )
+
+    def test_all_orders_after_address_change(self):
+        self.assertProfileEditRevalidates(
+            '/api/orders/all/', {}, self.update_address,
+            lambda rows: self.assertEqual(rows[0]['user']['address'], 'NEW ADDRESS'),
+        )
+
+    def test_cached_unassigned_feed_after_address_change(self):
+        make_order(self.user)
+        unassigned_feed.invalidate()
+        self.assertProfileEditRevalidates(
+            '/api/orders/unassigned/', {}, self.update_address,
+            lambda rows: self.assertEqual(rows[0]['user']['address'], 'NEW ADDRESS'),
+        )
+
+
+class FeedCacheTests(TestCase):
+    def test_page_read_before_an_invalidate_is_not_served_after_it(self):
+        feed = FeedCache('test')
+        generation, cached = feed.get('page_size=2')
+        self.assertIsNone(cached)
+        # An order lands while the missed page is being built
+        feed.invalidate()
+        feed.set('page_size=2', ['stale page'], generation)
+        self.assertIsNone(feed.get('page_size=2')[1])
+
+    def test_page_is_served_until_invalidated(self):
+        feed = FeedCache('test')
+        generation, _ = feed.get('page_size=2')
+        feed.set('page_size=2', ['page'], generation)
+        self.assertEqual(feed.get('page_size=2')[1], ['page'])
+        feed.invalidate()
+        self.assertIsNone(feed.get('page_size=2')[1])
+
+
+class SQLiteConcurrencyTests(TransactionTestCase):
+    def test_connections_use_wal(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_reads_do_not_wait_for_an_open_write(self):
+        user = make_user()
+        make_order(user)
+        locked, release = threading.Event(), threading.Event()
+
+        def writer():
+            try:
+                with transaction.atomic():
+                    Order.objects.update(delivery_status='cancelled')
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            start = time.monotonic()
+            # WAL: the reader sees the last committed state without waiting
+            self.assertEqual(Order.objects.filter(delivery_status='placed').count(), 1)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            release.set()
+            thread.join()
+
+
+class ChangeSequenceConcurrencyTests(TransactionTestCase):
+    def test_concurrent_creates_all_succeed_with_distinct_sequence_numbers(self):
+        user = make_user()
+        statuses, lock = [], threading.Lock()
+        body = json.dumps({
+            'phone_number': user.phone_number,
+            'total': 40,
+            'items': [{'item_name': 'Chai', 'quantity': 2, 'price_per_item': 20}],
+        })
+
+        def create_orders():
+            for _ in range(10):
+                response = self.client_class().post('/api/create-order/', body, content_type='application/json')
+                with lock:
+                    statuses.append(response.status_code)
+
+        run_threads(create_orders, 8)
+
+        self.assertEqual(statuses, [201] * 80)
+        seqs = sorted(Order.objects.values_list('change_seq', flat=True))
+        self.assertEqual(len(set(seqs)), 80)
+        self.assertEqual(seqs[-1], ChangeCounter.current('order'))
+
+
+class ClaimRaceTests(TransactionTestCase):
+    def accept(self, order, partner):
+        return self.client_class().patch(
+            f'/api/orders/{order.order_id}/update-status/',
+            json.dumps({'status': 'assigned', 'phone_number': partner.phone_number}),
+            content_type='application/json',
+        )
+
+    def test_exactly_one_partner_wins_a_concurrent_accept(self):
+        user = make_user()
+        partners = [make_partner('8000000001'), make_partner('8000000002')]
+        for _ in range(10):
+            order = make_order(user)
+            statuses, lock = [], threading.Lock()
+            barrier = threading.Barrier(2)
+            queue = list(partners)
+
+            def accept():
+                with lock:
+                    partner = queue.pop()
+                barrier.wait()
+                response = self.accept(order, partner)
+                with lock:
+                    statuses.append(response.status_code)
+
+            run_threads(accept, 2)
+
+            self.assertEqual(sorted(statuses), [200, 409])
+            order.refresh_from_db()
+            self.assertEqual(order.delivery_status, 'assigned')
+            self.assertFalse(OpenOrder.objects.filter(order=order).exists())
+
+    def test_lock_timeout_is_reported_as_conflict(self):
+        order, partner = make_order(make_user()), make_partner()
+        with mock.patch('core.views._update_order_status', side_effect=OperationalError('database is locked')):
+            response = self.accept(order, partner)
+        self.assertEqual(response.status_code, 409)
+
+
+class BroadcastDeliveryTests(TransactionTestCase):
+    @override_settings(BROADCAST_ASYNC=True)
+    async def test_committed_broadcast_reaches_an_in_memory_consumer(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/orders/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        def write():
+            # Request-thread side: the broadcast goes out on commit
+            with transaction.atomic():
+                broadcast_to_groups(['orders'], 'order_updated', {'order_id': 'abc', 'delivery_status': 'placed'})
+
+        # The in-memory layer's queues belong to this (the server's) loop, so
+        # the send must not be handed to the dispatcher's private loop
+        with mock.patch('core.utils.dispatcher.submit') as submit:
+            await sync_to_async(write)()
+        submit.assert_not_called()
+
+        frame = json.loads(await communicator.receive_from(timeout=1))
+        self.assertEqual(frame['order']['order_id'], 'abc')
+        await communicator.disconnect()
+
+
+@override_settings(WS_REPLAY={'enabled': True, 'size': 3, 'ttl': 3600, 'cache': 'ws_replay'})
+class ReplayResumeTests(TransactionTestCase):
+    group = 'user_9000000001'
+
+    def setUp(self):
+        caches['ws_replay'].clear()
+
+    async def broadcast(self, *order_ids):
+        def write():
+            for order_id in order_ids:
+                with transaction.atomic():
+                    broadcast_to_groups([self.group], 'order_updated', {'order_id': order_id, 'delivery_status': 'placed'})
+        await sync_to_async(write)()
+
+    async def resume(self, epoch, last_seq):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/orders/{self.group}/?epoch={epoch}&last_seq={last_seq}',
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_replays_only_events_after_last_seq(self):
+        await self.broadcast('a', 'b', 'c')
+        epoch, seq = replay_log.current(self.group)
+        self.assertEqual(seq, 3)
+
+        communicator = await self.resume(epoch, 1)
+        frames = [json.loads(await communicator.receive_from(timeout=1)) for _ in range(2)]
+        self.assertEqual([(f['epoch'], f['seq'], f['order']['order_id']) for f in frames], [(epoch, 2, 'b'), (epoch, 3, 'c')])
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_gap_longer_than_the_buffer_resyncs(self):
+        await self.broadcast('a', 'b', 'c', 'd', 'e')
+        epoch, _ = replay_log.current(self.group)
+
+        communicator = await self.resume(epoch, 1)
+        self.assertEqual(json.loads(await communicator.receive_from(timeout=1)), {'resync': True, 'stream': self.group})
+        await communicator.disconnect()
+
+    async def test_position_from_another_epoch_resyncs(self):
+        await self.broadcast('a', 'b')
+
+        communicator = await self.resume('0123456789ab', 1)
+        self.assertEqual(json.loads(await communicator.receive_from(timeout=1)), {'resync': True, 'stream': self.group})
+        await communicator.disconnect()
+
+    async def test_evicted_counter_starts_a_new_epoch_and_resyncs(self):
+        await self.broadcast('a', 'b')
+        old_epoch, _ = replay_log.current(self.group)
+        # The cache drops the counter: numbering restarts from 1...
+        caches['ws_replay'].delete(f'replay:{self.group}:seq')
+        await self.broadcast('c', 'd', 'e')
+        new_epoch, seq = replay_log.current(self.group)
+        self.assertNotEqual(new_epoch, old_epoch)
+        self.assertEqual(seq, 3)
+
+        # ...so a client at seq 2 of the old numbering must not skip 'c' and 'd'
+        communicator = await self.resume(old_epoch, 2)
+        self.assertEqual(json.loads(await communicator.receive_from(timeout=1)), {'resync': True, 'stream': self.group})
+        await communicator.disconnect()
+
+    async def test_position_before_the_first_event_replays_the_epoch(self):
+        # Snapshot position of a group with no events yet: no epoch, seq 0
+        self.assertEqual(replay_log.current(self.group), (None, 0))
+        await self.broadcast('a')
+
+        communicator = await self.resume('', 0)
+        frame = json.loads(await communicator.receive_from(timeout=1))
+        self.assertEqual((frame['seq'], frame['order']['order_id']), (1, 'a'))
+        await communicator.disconnect()
+
+
+class PartnerConsumerTests(TransactionTestCase):
+    async def connect(self, query):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/orders/partner/?{query}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def receive(self, communicator):
+        return json.loads(await communicator.receive_from(timeout=1))
+
+    async def broadcast(self, group_name, order_id, delivery_status):
+        def write():
+            with transaction.atomic():
+                broadcast_to_groups([group_name], 'order_updated', {'order_id': order_id, 'delivery_status': delivery_status})
+        await sync_to_async(write)()
+
+    async def test_partner_only_gets_its_own_orders(self):
+        await sync_to_async(make_partner)('8000000001')
+        await sync_to_async(make_partner)('8000000002')
+        ravi = await self.connect('phone=8000000001')
+        other = await self.connect('phone=8000000002')
+        self.assertEqual((await self.receive(ravi))['stream'], 'partner_8000000001')
+        self.assertEqual((await self.receive(other))['stream'], 'partner_8000000002')
+
+        await self.broadcast(partner_group('8000000001'), 'abc', 'assigned')
+        frame = await self.receive(ravi)
+        self.assertEqual((frame['stream'], frame['order']['order_id']), ('partner_8000000001', 'abc'))
+        self.assertTrue(await other.receive_nothing(timeout=0.2))
+        await ravi.disconnect()
+        await other.disconnect()
+
+    async def test_unknown_partner_is_refused(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/orders/partner/?phone=8000000009')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_status_filter_drops_other_statuses(self):
+        await sync_to_async(make_partner)()
+        communicator = await self.connect('phone=8000000001&status=delivered')
+        await self.receive(communicator)  # snapshot
+
+        await self.broadcast(partner_group('8000000001'), 'abc', 'out_for_delivery')
+        await self.broadcast(partner_group('8000000001'), 'abc', 'delivered')
+        await self.broadcast(UNASSIGNED_GROUP, 'new', 'placed')
+        frame = await self.receive(communicator)
+        self.assertEqual(frame['order']['delivery_status'], 'delivered')
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+    async def test_going_offline_leaves_the_open_orders_feed(self):
+        partner = await sync_to_async(make_partner)()
+        order = await sync_to_async(lambda: make_order(make_user()))()
+        communicator = await self.connect('phone=8000000001')
+        snapshot = await self.receive(communicator)
+        self.assertEqual([o['order_id'] for o in snapshot['orders']], [str(order.order_id)])
+
+        async def set_online(is_online):
+            def write():
+                with transaction.atomic():
+                    partner.is_online = is_online
+                    partner.save(update_fields=['is_online'])
+                    notify_partner_status(partner)
+            await sync_to_async(write)()
+
+        await set_online(False)
+        self.assertEqual((await self.receive(communicator))['orders'], [])
+        await self.broadcast(UNASSIGNED_GROUP, 'new', 'placed')
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        # Assigned orders still come through while offline
+        await self.broadcast(partner_group('8000000001'), 'abc', 'assigned')
+        self.assertEqual((await self.receive(communicator))['order']['order_id'], 'abc')
+
+        await set_online(True)
+        snapshot = await self.receive(communicator)
+        self.assertEqual([o['order_id'] for o in snapshot['orders']], [str(order.order_id)])
+        await self.broadcast(UNASSIGNED_GROUP, 'new', 'placed')
+        self.assertEqual((await self.receive(communicator))['order']['order_id'], 'new')
+        await communicator.disconnect()
+
+    async def test_offline_partner_does_not_join_the_open_orders_feed(self):
+        await sync_to_async(lambda: DeliveryPartner.objects.create(
+            phone_number='8000000001', name='Ravi', address='4 Park Street', is_online=False,
+        ))()
+        communicator = await self.connect('phone=8000000001')
+        self.assertEqual((await self.receive(communicator))['orders'], [])
+        await self.broadcast(UNASSIGNED_GROUP, 'new', 'placed')
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+
+class SendQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.sent = []
+
+    async def send(self, text_data):
+        self.sent.append(text_data)
+
+    def delta(self, before):
+        return {key: value - before[key] for key, value in ws_queue_metrics.snapshot().items()}
+
+    async def test_overflow_drops_the_oldest_frame(self):
+        before = ws_queue_metrics.snapshot()
+        queue = SendQueue(self.send, maxsize=2, policy=DROP_OLDEST, window=0)
+        for text in ('a', 'b', 'c'):
+            self.assertTrue(queue.put(text, 'same-order'))
+        self.assertEqual(list(queue.frames.values()), ['b', 'c'])
+        self.assertEqual(self.delta(before)['dropped'], 1)
+
+        queue.start()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, ['b', 'c'])
+        queue.close()
+        self.assertEqual(self.delta(before)['queued'], 0)
+
+    async def test_overflow_under_disconnect_refuses_the_frame(self):
+        before = ws_queue_metrics.snapshot()
+        queue = SendQueue(self.send, maxsize=2, policy=DISCONNECT, window=0)
+        self.assertTrue(queue.put('a'))
+        self.assertTrue(queue.put('b'))
+        self.assertFalse(queue.put('c'))
+        self.assertEqual(list(queue.frames.values()), ['a', 'b'])
+        self.assertEqual(self.delta(before)['disconnected'], 1)
+        queue.close()
+
+    async def test_full_coalesce_queue_replaces_the_queued_frame_of_the_same_order(self):
+        queue = SendQueue(self.send, maxsize=2, policy=COALESCE, window=0)
+        queue.put('order 1 placed', 1)
+        queue.put('order 2 placed', 2)
+        queue.put('order 1 assigned', 1)
+        self.assertEqual(list(queue.frames.values()), ['order 1 assigned', 'order 2 placed'])
+        queue.close()
+
+    async def test_frames_within_the_window_coalesce_per_order(self):
+        before = ws_queue_metrics.snapshot()
+        queue = SendQueue(self.send, maxsize=10, policy=DROP_OLDEST, window=0.05)
+        queue.start()
+        for status in ('placed', 'assigned', 'delivered'):
+            queue.put(f'order 1 {status}', 1)
+        queue.put('order 2 placed', 2)
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.sent, [])  # still inside the window
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.sent, ['order 1 delivered', 'order 2 placed'])
+        self.assertEqual(self.delta(before)['coalesced'], 2)
+
+        # After the window has flushed, the next change is a new frame
+        queue.put('order 1 cancelled', 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.sent[-1], 'order 1 cancelled')
+        queue.close()
+
+
+class WSMetricsViewTests(TestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/api/ws/metrics/').status_code, 403)
+
+        # Django admin accounts (auth.User), not app customers
+        user = get_user_model().objects.create_user('ops', password='x')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/ws/metrics/').status_code, 403)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get('/api/ws/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('dropped', response.json())
+
+
+class HashRingTests(SimpleTestCase):
+    hosts = ['redis://10.0.0.1:6379', 'redis://10.0.0.2:6379', 'redis://10.0.0.3:6379', 'redis://10.0.0.4:6379']
+    keys = [f'user_{9000000000 + i}' for i in range(4000)]
+
+    def owners(self, hosts):
+        ring = HashRing(hosts)
+        return {key: hosts[ring.get(key)] for key in self.keys}
+
+    def test_owner_does_not_depend_on_host_order(self):
+        self.assertEqual(self.owners(self.hosts), self.owners(list(reversed(self.hosts))))
+
+    def test_keys_spread_over_every_host(self):
+        counts = {host: 0 for host in self.hosts}
+        for owner in self.owners(self.hosts).values():
+            counts[owner] += 1
+        for host, count in counts.items():
+            self.assertGreater(count / len(self.keys), 0.15, host)
+            self.assertLess(count / len(self.keys), 0.35, host)
+
+    def test_adding_a_host_only_moves_keys_onto_it(self):
+        before = self.owners(self.hosts)
+        after = self.owners(self.hosts + ['redis://10.0.0.5:6379'])
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertTrue(all(after[key] == 'redis://10.0.0.5:6379' for key in moved))
+        # About 1/5 of the keys, not the ~4/5 that crc32 % N would move
+        self.assertGreater(len(moved) / len(self.keys), 0.1)
+        self.assertLess(len(moved) / len(self.keys), 0.3)
+
+    def test_removing_a_host_only_moves_its_keys(self):
+        before = self.owners(self.hosts)
+        after = self.owners(self.hosts[:2] + self.hosts[3:])
+        for key in self.keys:
+            if before[key] != self.hosts[2]:
+                self.assertEqual(after[key], before[key])
+
+
+class FakeRedis:
+    """In-process stand-in for one Redis shard: just the sorted-set commands the channel layer's group calls use."""
+
+    def __init__(self):
+        self.sets = {}
+
+    async def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.sets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, min, max):
+        members = self.sets.get(key, {})
+        for member, score in list(members.items()):
+            if min <= score <= max:
+                del members[member]
+
+    async def zrange(self, key, start, end):
+        members = sorted(self.sets.get(key, {}).items(), key=lambda item: item[1])
+        return [member.encode() if isinstance(member, str) else member for member, _ in members]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    async def eval(self, script, numkeys, *args):
+        # group_send's script: ZADD each channel's message unless it is at capacity
+        keys, messages, capacities = args[:numkeys], args[numkeys:2 * numkeys], args[2 * numkeys:3 * numkeys]
+        over_capacity = 0
+        for key, message, capacity in zip(keys, messages, capacities):
+            if len(self.sets.get(key, {})) < capacity:
+                await self.zadd(key, {message: args[-2]})
+            else:
+                over_capacity += 1
+        return over_capacity
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def zremrangebyscore(self, *args, **kwargs):
+        self.calls.append(self.redis.zremrangebyscore(*args, **kwargs))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@skipIf(ShardedRedisChannelLayer is None, 'channels_redis is not installed')
+class ShardedChannelLayerTests(SimpleTestCase):
+    hosts = ['redis://10.0.0.1:6379', 'redis://10.0.0.2:6379', 'redis://10.0.0.3:6379']
+
+    def setUp(self):
+        self.shards = [FakeRedis() for _ in self.hosts]
+        # Two workers sharing the same Redis hosts
+        self.workers = [self.make_layer(), self.make_layer()]
+
+    def make_layer(self):
+        layer = ShardedRedisChannelLayer(hosts=self.hosts)
+        layer.connection = lambda index: self.shards[index]
+        return layer
+
+    def holding(self, key):
+        return [index for index, shard in enumerate(self.shards) if shard.sets.get(key)]
+
+    async def test_each_group_lives_on_its_ring_shard(self):
+        layer = self.workers[0]
+        groups = [f'user_{9000000000 + i}' for i in range(30)]
+        for group in groups:
+            await layer.group_add(group, await layer.new_channel())
+        for group in groups:
+            self.assertEqual(self.holding(layer._group_key(group)), [layer.ring.get(group)])
+        self.assertGreater(len({layer.ring.get(group) for group in groups}), 1)
+
+    async def test_group_send_reaches_members_on_every_worker(self):
+        members = {}
+        for worker in self.workers:
+            for _ in range(3):
+                channel = await worker.new_channel()
+                await self.workers[0].group_add('orders_unassigned', channel)
+                members[channel] = worker
+
+        await self.workers[1].group_send('orders_unassigned', {'type': 'order.created', 'text': '{"order":{}}'})
+
+        for worker in self.workers:
+            # Each worker's process-local channels share one key, on that key's shard
+            name = worker.non_local_name(await worker.new_channel())
+            [message] = self.shards[worker.consistent_hash(name)].sets[worker.prefix + name]
+            message = worker.deserialize(message)
+            self.assertEqual(message['text'], '{"order":{}}')
+            self.assertEqual(
+                sorted(message['__asgi_channel__']),
+                sorted(channel for channel, owner in members.items() if owner is worker),
+            )
+
+    async def test_group_discard_removes_the_member_from_its_shard(self):
+        layer = self.workers[0]
+        channel = await layer.new_channel()
+        await layer.group_add('partner_8000000001', channel)
+        await layer.group_discard('partner_8000000001', channel)
+        self.assertEqual(self.holding(layer._group_key('partner_8000000001')), [])
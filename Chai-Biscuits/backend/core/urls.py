@@ -17,6 +17,7 @@ urlpatterns = [
     path('verify-otp-partner/', verify_otp_partner),
     path('get-partner-profile/', get_partner_profile),
     path('delivery-partner/update-profile/', update_delivery_partner_profile),
+    path('partner/stats/', partner_stats),
     
     # Orders
     path('create-order/', create_order),
@@ -25,7 +26,11 @@ urlpatterns = [
     path('orders/unassigned/', unassigned_orders),
     path('orders/assigned/', assigned_orders),
     path('orders/history/', delivery_history),
+    path('orders/changes/', order_changes),
     path('orders/<str:order_id>/status/', get_order_status),
     # path('confirm-order/<str:order_id>/', confirm_order, name='confirm_order'),
     path('orders/<uuid:order_id>/update-status/', views.update_order_status, name='update_order_status'),
+
+    # WebSocket send queues
+    path('ws/metrics/', ws_metrics),
 ]
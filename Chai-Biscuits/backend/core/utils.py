@@ -1,15 +1,137 @@
+import asyncio
+import logging
+import threading
+
 from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .fastjson import dumps_str
+from .replay import replay_log
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastDispatcher:
+    """
+    Runs channel-layer sends on one background event loop so request
+    threads never wait on channel-layer I/O. A single loop keeps sends in
+    the order they were queued and lets the layer reuse its connections.
+
+    Only for layers that do their own I/O (Redis). InMemoryChannelLayer
+    hands messages to consumers through asyncio queues owned by the
+    server's loop; filling them from this loop never wakes the consumer.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name='broadcast-dispatcher', daemon=True
+                ).start()
+            return self._loop
+
+    async def _send(self, group_name, message):
+        try:
+            await get_channel_layer().group_send(group_name, message)
+        except Exception:
+            logger.exception("Broadcast to %s failed", group_name)
+
+    def submit(self, group_name, message):
+        asyncio.run_coroutine_threadsafe(self._send(group_name, message), self._get_loop())
+
+
+dispatcher = BroadcastDispatcher()
+
+
+def _send_now(group_name, message):
+    # Called from a request thread, async_to_sync runs the send on the
+    # ASGI server's event loop, which is where in-memory consumers wait
+    try:
+        async_to_sync(get_channel_layer().group_send)(group_name, message)
+    except Exception:
+        logger.exception("Broadcast to %s failed", group_name)
+
+
+UNASSIGNED_GROUP = "orders_unassigned"
 
-def broadcast_to_group(group_name, event, order_payload):
+
+def partner_group(phone):
+    """Group for events about orders assigned to one delivery partner."""
+    return f"partner_{phone}"
+
+
+def order_frame(order_data):
+    """The WebSocket text frame consumers forward for an order event."""
+    return dumps_str({"order": order_data})
+
+
+def broadcast_to_groups(group_names, event_type, order_data):
     """
-    Broadcast a message to a given WebSocket group.
+    Broadcast order_data to several WebSocket groups once the current
+    transaction commits, so clients never hear about writes that were
+    rolled back. event_type is the consumer handler, e.g. 'order_created'
+    or 'order_updated'.
+
+    The frame is encoded here, once, and travels through the channel layer
+    as text; consumers send it as-is instead of each re-encoding the order.
+    Each group's copy is stamped with that group's next sequence number
+    (core/replay.py) so reconnecting clients can resume from it.
     """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "order_updated",   # Ye consumer ke andar hona chahiye
-            "order": order_payload
-        }
-    )
+    message = {
+        "type": event_type,
+        "order_id": order_data.get("order_id"),
+        "delivery_status": order_data.get("delivery_status"),
+        "text": order_frame(order_data),
+    }
+
+    _send_on_commit(group_names, message, numbered=True)
+
+
+def use_dispatcher():
+    if not getattr(settings, 'BROADCAST_ASYNC', False):
+        return False
+    return not isinstance(get_channel_layer(), InMemoryChannelLayer)
+
+
+def _number(group_name, message):
+    try:
+        epoch, seq, text = replay_log.append(
+            group_name, message["order_id"], message["delivery_status"], message["text"]
+        )
+    except Exception:
+        logger.exception("Could not record %s in the replay log", group_name)
+        return message
+    return {**message, "stream": group_name, "epoch": epoch, "seq": seq, "text": text}
+
+
+def _send_on_commit(group_names, message, numbered=False):
+    # Sequence numbers are taken at commit time, in the order the
+    # dispatcher will send, so clients see them strictly increasing
+    def send():
+        for group_name in group_names:
+            group_message = _number(group_name, message) if numbered else message
+            if use_dispatcher():
+                dispatcher.submit(group_name, group_message)
+            else:
+                _send_now(group_name, group_message)
+
+    transaction.on_commit(send)
+
+
+def broadcast_to_group(group_name, event_type, order_data):
+    broadcast_to_groups([group_name], event_type, order_data)
+
+
+def notify_partner_status(partner):
+    """Tell the partner's open sockets to join or leave the open orders feed."""
+    _send_on_commit([partner_group(partner.phone_number)], {
+        "type": "partner_status",
+        "is_online": partner.is_online,
+    })
@@ -1,36 +1,34 @@
 import random
 from django.http import JsonResponse
-import requests
 from .models import *
 from django.views.decorators.csrf import csrf_exempt
 import json
 from django.utils import timezone
-from .serializers import *
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from datetime import timedelta
+from datetime import date
 from django.utils import timezone
 from decimal import Decimal
 from django.shortcuts import get_object_or_404
-from .utils import broadcast_to_group 
-
-
-def broadcast_to_group(group_name: str, event_type: str, order_data: dict):
-    """
-    Helper: send order_data to group_name.
-    event_type should be 'order_created', 'order_assigned', or 'order_updated'
-    """
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": event_type, 
-            "order": order_data
-        }
-    )
+from django.db import transaction, OperationalError
+from django.db.models import Sum
+from .utils import broadcast_to_groups, notify_partner_status, partner_group, UNASSIGNED_GROUP
+from .sms import send_otp_sms
+from . import otp_store
+from .otp_store import get_otp_store
+from .ratelimit import rate_limit
+from .db import read_from_replica, mark_recent_write
+from .feed_cache import unassigned_feed
+from .fastjson import FastJsonResponse
+from .outbox import metrics as ws_queue_metrics
+from .encoders import (
+    order_rows, encode_rows, encode_instance, encode_orders_by_pk,
+    encode_order_by_pk, encode_datetime, encode_money,
+)
+from .pagination import PaginationError, paginate_by_cursor, cursor_response, get_page_size
+from .conditional import make_etag, queryset_etag, profiles_version, etag_matches, not_modified, with_etag
 
 
 @csrf_exempt
@@ -45,11 +43,15 @@ def get_user_profile(request):
 
             user = CustomUser.objects.get(phone_number=phone)
 
-            return JsonResponse({
+            etag = make_etag('user', user.pk, user.updated_at.isoformat())
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            return with_etag(JsonResponse({
                 'name': user.name,
                 'phone_number': user.phone_number,
                 'address': user.address
-            })
+            }), etag)
 
         except CustomUser.DoesNotExist:
             return JsonResponse({'error': 'User not found'}, status=404)
@@ -72,6 +74,8 @@ def update_user_profile(request):
             user = CustomUser.objects.get(phone_number=phone)
             user.address = address
             user.save()
+            # Open orders embed the customer's address
+            unassigned_feed.invalidate_on_commit()
             return JsonResponse({'message': 'Address updated successfully'})
         except CustomUser.DoesNotExist:
             return JsonResponse({'error': 'User not found'}, status=404)
@@ -90,11 +94,15 @@ def get_partner_profile(request):
 
             user = DeliveryPartner.objects.get(phone_number=phone)
 
-            return JsonResponse({
+            etag = make_etag('partner', user.pk, user.updated_at.isoformat())
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            return with_etag(JsonResponse({
                 'name': user.name,
                 'phone_number': user.phone_number,
                 'address': user.address
-            })
+            }), etag)
 
         except DeliveryPartner.DoesNotExist:
             return JsonResponse({'error': 'User not found'}, status=404)
@@ -124,6 +132,7 @@ def register_user(request):
         if not created:
             return JsonResponse({'error': 'User already exists'}, status=400)
 
+        mark_recent_write(phone_number)
         return JsonResponse({'message': 'User registered successfully'})
 
 
@@ -131,6 +140,7 @@ def generate_otp():
     return str(random.randint(1000, 9999))
 
 @csrf_exempt
+@rate_limit('send_otp')
 def send_otp(request):
     if request.method == 'POST':
         try:
@@ -149,19 +159,11 @@ def send_otp(request):
 
             otp = generate_otp()
 
-            # Save OTP in DB
-            OTP.objects.update_or_create(
-                phone_number=phone,
-                defaults={'otp': otp, 'created_at': timezone.now()}
-            )
-
-            print(f"[DEBUG] Saved OTP {otp} for {phone}")
+            # Save OTP (OTP_STORE; see core/otp_store.py)
+            get_otp_store().save(phone, otp)
 
-            # Send OTP (real API in production)
-            api_key = 'cfc26a50-6ebb-11f0-a562-0200cd936042'
-            url = f'https://2factor.in/API/V1/{api_key}/SMS/{phone}/{otp}'
-            response = requests.get(url)
-            print(f'Sending OTP {otp} to {phone}, API response: {response.text}')
+            # Send OTP in the background (see core/sms.py)
+            send_otp_sms(phone, otp)
 
             return JsonResponse({'message': 'OTP sent successfully'})
         except Exception as e:
@@ -169,6 +171,7 @@ def send_otp(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 @csrf_exempt
+@rate_limit('send_otp')
 def send_otp_partner(request):
     if request.method == 'POST':
         try:
@@ -187,19 +190,11 @@ def send_otp_partner(request):
 
             otp = generate_otp()
 
-            # Save OTP in DB
-            OTP.objects.update_or_create(
-                phone_number=phone,
-                defaults={'otp': otp, 'created_at': timezone.now()}
-            )
-
-            print(f"[DEBUG] Saved OTP {otp} for {phone}")
+            # Save OTP (OTP_STORE; see core/otp_store.py)
+            get_otp_store().save(phone, otp)
 
-            # Send OTP (real API in production)
-            api_key = 'cfc26a50-6ebb-11f0-a562-0200cd936042'
-            url = f'https://2factor.in/API/V1/{api_key}/SMS/{phone}/{otp}'
-            response = requests.get(url)
-            print(f'Sending OTP {otp} to {phone}, API response: {response.text}')
+            # Send OTP in the background (see core/sms.py)
+            send_otp_sms(phone, otp)
 
             return JsonResponse({'message': 'OTP sent successfully'})
         except Exception as e:
@@ -207,6 +202,7 @@ def send_otp_partner(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 @csrf_exempt
+@rate_limit('verify_otp')
 def verify_otp(request):
     if request.method == 'POST':
         try:
@@ -218,14 +214,15 @@ def verify_otp(request):
             if not all([phone, entered_otp, name]):
                 return JsonResponse({'error': 'Phone number, name, and OTP required'}, status=400)
 
-            otp_record = OTP.objects.filter(phone_number=phone).latest('created_at')
+            result = get_otp_store().verify(phone, str(entered_otp))
 
-            if timezone.now() - otp_record.created_at > timedelta(minutes=5):
+            if result == otp_store.MISSING:
+                return JsonResponse({'error': 'OTP not found'}, status=400)
+
+            if result == otp_store.EXPIRED:
                 return JsonResponse({'error': 'OTP expired'}, status=400)
 
-            if otp_record.otp == entered_otp:
-                otp_record.delete()  # Delete after successful verification
-                
+            if result == otp_store.VALID:
                 try:
                     # ✅ Match both name and phone number here too
                     user = CustomUser.objects.get(phone_number=phone, name=name)
@@ -238,13 +235,12 @@ def verify_otp(request):
                     return JsonResponse({'error': 'User not found with given name and phone'}, status=404)
             else:
                 return JsonResponse({'error': 'Invalid OTP'}, status=400)
-        except OTP.DoesNotExist:
-            return JsonResponse({'error': 'OTP not found'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 @csrf_exempt
+@rate_limit('verify_otp')
 def verify_otp_partner(request):
     if request.method == 'POST':
         try:
@@ -258,14 +254,15 @@ def verify_otp_partner(request):
             if not all([phone, entered_otp, name]):
                 return JsonResponse({'error': 'Phone number, name, and OTP required'}, status=400)
 
-            otp_record = OTP.objects.filter(phone_number=phone).latest('created_at')
+            result = get_otp_store().verify(phone, str(entered_otp))
+
+            if result == otp_store.MISSING:
+                return JsonResponse({'error': 'OTP not found'}, status=400)
 
-            if timezone.now() - otp_record.created_at > timedelta(minutes=5):
+            if result == otp_store.EXPIRED:
                 return JsonResponse({'error': 'OTP expired'}, status=400)
 
-            if otp_record.otp == entered_otp:
-                otp_record.delete()  # Delete after successful verification
-                
+            if result == otp_store.VALID:
                 try:
                     # ✅ Match both name and phone number here too
                     user = DeliveryPartner.objects.get(phone_number=phone, name=name)
@@ -278,8 +275,6 @@ def verify_otp_partner(request):
                     return JsonResponse({'error': 'User not found with given name and phone'}, status=404)
             else:
                 return JsonResponse({'error': 'Invalid OTP'}, status=400)
-        except OTP.DoesNotExist:
-            return JsonResponse({'error': 'OTP not found'}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
@@ -301,48 +296,36 @@ def create_order(request):
 
             user = CustomUser.objects.get(phone_number=phone)
 
-            order = Order.objects.create(
-                user=user,
-                total_amount=Decimal(str(total)),
-                delivery_status=delivery_status,
-                delivery_address=user.address 
-            )
-
-            for item in items:
-                OrderItem.objects.create(
-                    order=order,
-                    item_name=item.get('item_name') or item.get('name'),
-                    quantity=item['quantity'],
-                    price_per_item=Decimal(str(item.get('price_per_item') or item.get('price')))
+            # Order and all its items go in together, items in a single INSERT
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=user,
+                    total_amount=Decimal(str(total)),
+                    delivery_status=delivery_status,
+                    delivery_address=user.address 
                 )
-                
-            # order payload for broadcasting
-            order_payload = {
-                "order_id": str(order.order_id),
-                "placed_at": order.placed_at.isoformat(),
-                "out_for_delivery_at": order.out_for_delivery_at.isoformat() if order.out_for_delivery_at else None,
-                "delivery_time": order.delivery_time,
-                "total_amount": str(order.total_amount),
-                "delivery_status": order.delivery_status,
-                "assigned_to": {
-                    "id": order.assigned_to.id,
-                    "name": order.assigned_to.name,
-                    "phone_number": order.assigned_to.phone_number
-                } if order.assigned_to else None,
-                "user": {  # ✅ Include customer info
-                    "name": order.user.name,
-                    "phone_number": order.user.phone_number,
-                    "address": order.user.address
-                },
-                "items": [{"name": it.item_name, "quantity": it.quantity, "price": str(it.price_per_item)} for it in order.items.all()],
-                "delivery_address": order.user.address,
-            }
-
-            
-             # Broadcast to unassigned orders group (partners listening)
-            broadcast_to_group("orders_unassigned", "order_created", order_payload)
-            # Also notify the user group (so user's UI can react)
-            broadcast_to_group(f"user_{order.user.phone_number}", "order_updated", order_payload)
+
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        item_name=item.get('item_name') or item.get('name'),
+                        quantity=item['quantity'],
+                        price_per_item=Decimal(str(item.get('price_per_item') or item.get('price')))
+                    )
+                    for item in items
+                ])
+                OpenOrder.sync(order)
+                unassigned_feed.invalidate_on_commit()
+                mark_recent_write(user.phone_number)
+
+                # order payload for broadcasting
+                order_payload = encode_instance(order, order_items)
+
+                # Broadcasts go out after commit (see utils.broadcast_to_groups)
+                # Broadcast to unassigned orders group (partners listening)
+                broadcast_to_groups([UNASSIGNED_GROUP], "order_created", order_payload)
+                # Also notify the user group (so user's UI can react)
+                broadcast_to_groups([f"user_{order.user.phone_number}"], "order_updated", order_payload)
 
             return JsonResponse({
                 'message': 'Order created successfully',
@@ -360,6 +343,7 @@ def create_order(request):
 
 
 @api_view(['GET'])
+@read_from_replica
 def user_order_history(request):
     phone = request.GET.get('phone')
     if not phone:
@@ -370,38 +354,86 @@ def user_order_history(request):
     except CustomUser.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
 
-    orders = Order.objects.filter(user=user).order_by('-placed_at')
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    # Hot and archived orders together (see core/archive.py)
+    orders = Order.objects.filter(user=user)
+    archived = ArchivedOrder.objects.filter(user=user)
+    etag = make_etag(queryset_etag(request, orders), queryset_etag(request, archived))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        page, next_cursor = paginate_by_cursor(request, [order_rows(orders), order_rows(archived)], 'placed_at')
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=400)
+    return with_etag(cursor_response(request, encode_rows(page), next_cursor), etag)
 
 
 @api_view(['GET'])
+@read_from_replica
 def all_orders(request):
     """All placed orders (admin-level or for delivery panel overview)"""
-    orders = Order.objects.all().order_by('-placed_at')
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    orders = Order.objects.all()
+    etag = make_etag(queryset_etag(request, orders, profiles=False), *profiles_version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        page, next_cursor = paginate_by_cursor(request, order_rows(orders), 'placed_at')
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=400)
+    return with_etag(cursor_response(request, encode_rows(page), next_cursor), etag)
 
 
 @api_view(['GET'])
 def unassigned_orders(request):
     """View orders that are not yet assigned to any delivery partner"""
-    orders = Order.objects.filter(assigned_to__isnull=True).order_by('placed_at')
-    serializer = OrderSerializer(orders, many=True)
-    data = serializer.data
+    # Every partner polls this, so serve the cached page until the queue changes
+    params = request.GET.urlencode()
+    generation, cached = unassigned_feed.get(params)
+    if cached is None:
+        # Read the open-orders queue, not the whole Order table
+        queue = OpenOrder.objects.all()
+        etag = queryset_etag(request, queue, order_path='order__')
+        try:
+            page, next_cursor = paginate_by_cursor(request, queue.values('pk', 'placed_at'), 'placed_at', descending=False)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=400)
+        encoded = encode_orders_by_pk([entry['pk'] for entry in page])
+        cached = ([encoded[entry['pk']] for entry in page if entry['pk'] in encoded], next_cursor, etag)
+        unassigned_feed.set(params, cached, generation)
 
-    # ✅ Add customer info to each order
-    for i, order in enumerate(orders):
-        data[i]['user'] = {
-            "name": order.user.name,
-            "phone_number": order.user.phone_number,
-            "address": order.user.address
-        }
+    data, next_cursor, etag = cached
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return with_etag(cursor_response(request, data, next_cursor), etag)
 
-    return Response(data)
 
 
 
+@api_view(['GET'])
+def order_changes(request):
+    """
+    Orders created or updated after the client's `since` token, oldest
+    change first. Without `since` only the current token is returned, so a
+    client can take the token, do its full load and then poll from there.
+    """
+    since = request.GET.get('since')
+    if since is None:
+        return Response({'changes': [], 'next': str(ChangeCounter.current('order')), 'has_more': False})
+
+    try:
+        since = int(since)
+        limit = get_page_size(request)
+    except (ValueError, PaginationError):
+        return Response({'error': 'Invalid since token or page_size'}, status=400)
+
+    rows = list(order_rows(Order.objects.filter(change_seq__gt=since).order_by('change_seq'))[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return Response({
+        'changes': encode_rows(rows),
+        'next': str(rows[-1]['change_seq'] if rows else since),
+        'has_more': has_more,
+    })
+
 
 @api_view(['GET'])
 def assigned_orders(request):
@@ -418,22 +450,19 @@ def assigned_orders(request):
     orders = Order.objects.filter(
         assigned_to=partner,
         delivery_status__in=['assigned']  # Only show active/pending
-    ).order_by('-placed_at')
-    serializer = OrderSerializer(orders, many=True)
-    data = serializer.data
-
-    # ✅ Add customer info to each order
-    for i, order in enumerate(orders):
-        data[i]['user'] = {
-            "name": order.user.name,
-            "phone_number": order.user.phone_number,
-            "address": order.user.address
-        }
-
-    return Response(data)
+    )
+    etag = queryset_etag(request, orders)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    try:
+        page, next_cursor = paginate_by_cursor(request, order_rows(orders), 'placed_at')
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=400)
+    return with_etag(cursor_response(request, encode_rows(page), next_cursor), etag)
 
 
 @api_view(['GET'])
+@read_from_replica
 def delivery_history(request):
     phone = request.GET.get('phone')
     if not phone:
@@ -445,40 +474,87 @@ def delivery_history(request):
         return Response({'error': 'Delivery partner not found'}, status=404)
 
     # Fetch related delivery history records
-    history = DeliveryHistory.objects.filter(delivery_partner=partner).select_related(
-        "order", "delivery_partner"
-    ).prefetch_related("order__items").order_by('-completed_at')
+    history = DeliveryHistory.objects.filter(delivery_partner=partner)
+    archived = ArchivedDeliveryHistory.objects.filter(delivery_partner=partner)
+    etag = make_etag(
+        queryset_etag(request, history, order_path='order__'),
+        queryset_etag(request, archived, order_path='order__'),
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    history_values = ('pk', 'order_id', 'completed_at', 'status', 'earnings')
+    try:
+        page, next_cursor = paginate_by_cursor(
+            request, [history.values(*history_values), archived.values(*history_values)], 'completed_at'
+        )
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=400)
 
+    orders = encode_orders_by_pk([h['order_id'] for h in page])
     data = []
-    for h in history:
-        order_items = []
-        for item in h.order.items.all():
-            order_items.append({
-                'item_name': item.item_name,
-                'quantity': item.quantity,
-                'price_per_item': str(item.price_per_item)
-            })
-
+    for h in page:
         data.append({
-            'order_id': str(h.order.order_id),
-            'delivery_status': 'delivered' if h.status == 'completed' else h.status,
-            'completed_at': h.completed_at.isoformat() if h.completed_at else None,
-            'earnings': str(h.earnings),
-            'total_amount': str(h.order.total_amount),
+            **orders[h['order_id']],
+            'delivery_status': 'delivered' if h['status'] == 'completed' else h['status'],
+            'completed_at': encode_datetime(h['completed_at']),
+            'earnings': encode_money(h['earnings']),
             'assigned_to': {
-                'name': h.delivery_partner.name,
-                'phone_number': h.delivery_partner.phone_number
-            },
-            'user': {   # ✅ Include user info
-                'name': h.order.user.name,
-                'phone_number': h.order.user.phone_number,
-                'address': h.order.user.address
+                'id': partner.id,
+                'name': partner.name,
+                'phone_number': partner.phone_number
             },
-            'items': order_items
         })
 
-    return Response(data, status=200)
+    return with_etag(cursor_response(request, data, next_cursor), etag)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def ws_metrics(request):
+    """WebSocket send-queue counters for this worker process (staff only)."""
+    return Response(ws_queue_metrics.snapshot())
+
+
+@api_view(['GET'])
+def partner_stats(request):
+    """
+    Delivery totals for a partner over ?from=YYYY-MM-DD&to=YYYY-MM-DD
+    (both optional, inclusive), summed from the daily rollup.
+    """
+    phone = request.GET.get('phone')
+    if not phone:
+        return Response({'error': 'Phone number is required'}, status=400)
+
+    try:
+        partner = DeliveryPartner.objects.get(phone_number=phone)
+    except DeliveryPartner.DoesNotExist:
+        return Response({'error': 'Delivery partner not found'}, status=404)
 
+    stats = PartnerDailyStats.objects.filter(delivery_partner=partner)
+    try:
+        if request.GET.get('from'):
+            stats = stats.filter(day__gte=date.fromisoformat(request.GET['from']))
+        if request.GET.get('to'):
+            stats = stats.filter(day__lte=date.fromisoformat(request.GET['to']))
+    except ValueError:
+        return Response({'error': "'from' and 'to' must be YYYY-MM-DD"}, status=400)
+
+    totals = stats.aggregate(
+        deliveries=Sum('deliveries'),
+        cancellations=Sum('cancellations'),
+        earnings=Sum('earnings'),
+        delivery_seconds=Sum('delivery_seconds'),
+    )
+    deliveries = totals['deliveries'] or 0
+    return Response({
+        'phone_number': partner.phone_number,
+        'from': request.GET.get('from'),
+        'to': request.GET.get('to'),
+        'deliveries': deliveries,
+        'cancellations': totals['cancellations'] or 0,
+        'earnings': encode_money(totals['earnings'] or Decimal('0')),
+        'average_delivery_seconds': round(totals['delivery_seconds'] / deliveries) if deliveries else None,
+    })
 
 
 @csrf_exempt
@@ -494,8 +570,11 @@ def update_delivery_partner_profile(request):
             partner = DeliveryPartner.objects.get(phone_number=phone)
 
             partner.name = data.get('name', partner.name)
+            was_online = partner.is_online
             partner.is_online = data.get('is_online', partner.is_online)
             partner.save()
+            if partner.is_online != was_online:
+                notify_partner_status(partner)
 
             return JsonResponse({'message': 'Profile updated successfully'})
         except DeliveryPartner.DoesNotExist:
@@ -531,6 +610,7 @@ def register_delivery_partner(request):
                 address=address
             )
 
+            mark_recent_write(phone_number)
             return JsonResponse({'message': 'Delivery partner registered successfully'})
         except Exception as e:
             import traceback
@@ -557,43 +637,43 @@ def get_order_status(request, order_id):
             UUID(order_id)
         except ValueError:
             return JsonResponse({'error': 'Invalid order ID'}, status=400)
-        try:
-            order = Order.objects.get(order_id=order_id)
-
-            order_data = {
-                "order_id": str(order.order_id),
-                "delivery_status": order.delivery_status,
-                "total_amount": str(order.total_amount),
-                "placed_at": order.placed_at.isoformat(),
-                "delivery_time": order.delivery_time,
-                "assigned_to": {
-                    "id": order.assigned_to.id,
-                    "name": order.assigned_to.name,
-                    "phone_number": order.assigned_to.phone_number,
-                } if order.assigned_to else None,
-                "items": [
-                    {
-                        "item_name": it.item_name,
-                        "quantity": it.quantity,
-                        "price_per_item": str(it.price_per_item),
-                    }
-                    for it in order.items.all()
-                ]
-                
-            }
-
-            return JsonResponse(order_data, safe=False)
-
-        except Order.DoesNotExist:
+        row = order_rows(Order.objects.filter(order_id=order_id)).first()
+        if row is None:
+            # Old finished orders live in the archive
+            row = order_rows(ArchivedOrder.objects.filter(order_id=order_id)).first()
+        if row is None:
             return JsonResponse({"error": "Order not found"}, status=404)
 
+        etag = make_etag(
+            'order', row['order_id'], row['change_seq'], row['user__updated_at'], row['assigned_to__updated_at'],
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        order_data = encode_rows([row])[0]
+        return with_etag(FastJsonResponse(order_data), etag)
+
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
 
 @api_view(['PATCH'])
 def update_order_status(request, order_id):
+    # The transaction takes SQLite's write lock at BEGIN (core/backends/sqlite3),
+    # so a racing accept waits here and then sees the order already taken
+    try:
+        with transaction.atomic():
+            return _update_order_status(request, order_id)
+    except OperationalError as e:
+        if 'locked' not in str(e):
+            raise
+        # Waited out busy_timeout behind other writers
+        return Response({"error": "Order is being updated, please try again."}, status=409)
+
+
+def _update_order_status(request, order_id):
     order = get_object_or_404(Order, order_id=order_id)
+    was_open = order.assigned_to_id is None and order.delivery_status == "placed"
     status = request.data.get("status", "")
     phone_number = request.data.get("phone_number")
 
@@ -614,23 +694,31 @@ def update_order_status(request, order_id):
         if not phone_number:
             return Response({"error": "'phone_number' is required to assign order."}, status=400)
         partner = get_object_or_404(DeliveryPartner, phone_number=phone_number)
-        order.assigned_to = partner
-        order.assigned_at = timezone.now()
-        order.delivery_status = status
-        order.save()
+        version = request.data.get("version")
+        if version is not None:
+            try:
+                version = int(version)
+            except (TypeError, ValueError):
+                return Response({"error": "'version' must be an integer."}, status=400)
+
+        # Only one partner can win the race for an unassigned order
+        if not Order.objects.claim(order.pk, partner, version=version):
+            return Response({"error": "Order has already been assigned or was changed."}, status=409)
+        order.refresh_from_db()
 
     # -----------------
     # DELIVERED ORDER
     # -----------------
     elif status == "delivered":
         if not DeliveryHistory.objects.filter(order=order, status="completed").exists():
-            DeliveryHistory.objects.create(
+            history = DeliveryHistory.objects.create(
                 delivery_partner=order.assigned_to,
                 order=order,
                 completed_at=timezone.now(),
                 status="completed",
                 earnings=order.total_amount * Decimal(0.1)  # ✅ 10% earnings example
             )
+            PartnerDailyStats.record(history)
 
     # -----------------
     # CANCELLED ORDER
@@ -638,41 +726,41 @@ def update_order_status(request, order_id):
     elif status == "cancelled":
         partner = order.assigned_to
         if partner and not DeliveryHistory.objects.filter(order=order, status="cancelled").exists():
-            DeliveryHistory.objects.create(
+            history = DeliveryHistory.objects.create(
                 delivery_partner=partner,
                 order=order,
                 completed_at=timezone.now(),
                 status="cancelled",
                 earnings=0
             )
+            PartnerDailyStats.record(history)
 
     # -----------------
     # UPDATE ORDER STATUS
     # -----------------
-    order.delivery_status = status
-    order.save()
-
-    # Serialize full order (including assigned_to info)
-    # Serialize full order (including assigned_to info)
-    serializer = OrderSerializer(order)
-
-    data = serializer.data
-    data["delivery_address"] = order.user.address
-    data["user"] = {   # ✅ Add full customer info
-        "name": order.user.name,
-        "phone_number": order.user.phone_number,
-        "address": order.user.address
-    }
+    if status != "assigned":  # already written by claim()
+        order.delivery_status = status
+        order.save()
+        OpenOrder.sync(order)
 
+    # Assigning/cancelling (or reopening) changes the unassigned feed
+    if was_open or (order.assigned_to_id is None and order.delivery_status == "placed"):
+        unassigned_feed.invalidate_on_commit()
 
+    # Keep this customer's and partner's history reads on the primary for a bit
+    mark_recent_write(order.user.phone_number, order.assigned_to.phone_number if order.assigned_to else None)
 
-   # Broadcast to user
-    broadcast_to_group(f"user_{order.user.phone_number}", "order_updated", data)
+    # Encode the full order once for the response and every broadcast
+    data = encode_order_by_pk(order.pk)
 
-    # Broadcast to groups
-    broadcast_to_group("orders", "order_updated", data)
+    # Broadcast to the user, the order groups and only the partner who holds
+    # the order; the frame is encoded once for all of them
+    groups = [f"user_{order.user.phone_number}", "orders"]
     if order.assigned_to is None:
-        broadcast_to_group("orders_unassigned", "order_updated", data)
+        groups.append(UNASSIGNED_GROUP)
+    else:
+        groups.append(partner_group(order.assigned_to.phone_number))
+    broadcast_to_groups(groups, "order_updated", data)
 
     print("Order Updated:", data)  # Debug log
 